@@ -0,0 +1,311 @@
+import asyncio
+import weakref
+from pathlib import Path
+from typing import AsyncIterator
+
+import grpc
+from django.conf import settings
+from django.core.cache import caches, InvalidCacheBackendError
+from google.protobuf.json_format import MessageToDict
+
+from .cache import LocalCache, Stale, make_entry, read_entry
+from .codecs import get_metadata_codec
+from .channels import get_channel_options
+from .client import get_channel_credentials
+from .decorators import async_cdn_cache
+from .storage import FileCache
+from .proto import cdn_pb2, cdn_pb2_grpc
+
+
+class AsyncCDNClient:
+    """asyncio counterpart of `CDNClient` built on grpc.aio.
+
+    grpc.aio channels are bound to the event loop that created them, so there is one
+    instance per running loop instead of one per process.
+    """
+    _instances = weakref.WeakKeyDictionary()
+    _cache_timeout = 60 * 60 * 24  # 24 hours default cache timeout, the hard TTL of metadata
+    _soft_ttl = None  # metadata older than this is served stale and refreshed in the background
+
+    def __new__(cls):
+        loop = asyncio.get_running_loop()
+        instance = cls._instances.get(loop)
+        if instance is not None:
+            return instance
+
+        server_address = getattr(settings, "CDN_GRPC_ADDRESS", "localhost")
+        service_name = getattr(settings, "SERVICE_NAME", None)
+        sub_service_name = getattr(settings, "SUB_SERVICE_NAME", None)
+
+        if not service_name:
+            raise Exception("Define SERVICE_NAME in django settings")
+        if not sub_service_name:
+            raise Exception("Define SUB_SERVICE_NAME in django settings")
+        if not server_address:
+            raise Exception("set CDN_GRPC_ADDRESS in django settings")
+
+        instance = super(AsyncCDNClient, cls).__new__(cls)
+        instance._service_name = service_name
+        instance._sub_service_name = sub_service_name
+
+        try:
+            instance._cdn_cache = caches['cdn']
+        except InvalidCacheBackendError:
+            raise Exception("setup new redis cache named cdn [with desired redis db] ")
+
+        instance._local_cache = None
+        local_cache_settings = getattr(settings, "CDN_LOCAL_CACHE", None)
+        if local_cache_settings:
+            instance._local_cache = LocalCache(max_entries=local_cache_settings.get("MAX_ENTRIES", 1024),
+                                               timeout=local_cache_settings.get("TIMEOUT", 30))
+
+        instance._file_cache = FileCache.from_settings()
+        instance._metadata_codec = get_metadata_codec()
+        instance._refresh_tasks = {}
+
+        ttl_settings = getattr(settings, "CDN_METADATA_TTL", None) or {}
+        instance._soft_ttl = ttl_settings.get("SOFT", cls._soft_ttl)
+        instance._cache_timeout = ttl_settings.get("HARD", cls._cache_timeout)
+
+        instance.channel = grpc.aio.secure_channel(server_address, get_channel_credentials(),
+                                                   options=get_channel_options(transfer=True))
+        instance.stub = cdn_pb2_grpc.CDNServiceStub(instance.channel)
+
+        cls._instances[loop] = instance
+        return instance
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, exc_type, exc_value, traceback):
+        await self.close()
+
+    async def close(self) -> None:
+        for loop, instance in list(self._instances.items()):
+            if instance is self:
+                del self._instances[loop]
+        for task in list(self._refresh_tasks.values()):
+            task.cancel()
+        await self.channel.close()
+
+    def _make_key(self, image_id: str) -> str:
+        """Make a namespaced cache key."""
+        # v2 entries are `make_entry` tuples, workers still reading plain values keep using cdn:{image_id}
+        return f"cdn:v2:{image_id}"
+
+    def _read_metadata_entry(self, entry, soft_ttl: float = None, hard_ttl: float = None):
+        result = read_entry(entry,
+                            soft_ttl=self._soft_ttl if soft_ttl is None else soft_ttl,
+                            hard_ttl=self._cache_timeout if hard_ttl is None else hard_ttl)
+        if isinstance(result, Stale):
+            return Stale(self._metadata_codec.decode(result.value))
+        return self._metadata_codec.decode(result)
+
+    def _metadata_entry_timeout(self, hard_ttl: float = None) -> float:
+        return max(self._cache_timeout, hard_ttl or 0)
+
+    async def _get_metadata(self, image_id: str, soft_ttl: float = None, hard_ttl: float = None) -> dict | Stale | None:
+        """Get metadata for an image_id, `Stale(metadata)` once it is older than the soft TTL."""
+        return self._read_metadata_entry(await self._cdn_cache.aget(self._make_key(image_id)), soft_ttl, hard_ttl)
+
+    async def _set_metadata(self, image_id: str, metadata: dict, soft_ttl: float = None,
+                            hard_ttl: float = None) -> None:
+        """Set or overwrite metadata for an image_id."""
+        await self._cdn_cache.aset(self._make_key(image_id), make_entry(self._metadata_codec.encode(metadata)),
+                                   timeout=self._metadata_entry_timeout(hard_ttl))
+        if self._local_cache is not None:
+            self._local_cache.set(image_id, metadata)
+
+    async def invalidate_metadata(self, image_id: str) -> None:
+        """Drop cached metadata for an image_id from both cache tiers."""
+        # Including the key older workers read, while they are still around
+        await self._cdn_cache.adelete_many([self._make_key(image_id), f"cdn:{image_id}"])
+        if self._local_cache is not None:
+            self._local_cache.delete(image_id)
+
+    @async_cdn_cache(_get_metadata, _set_metadata, use_local_cache=True, cache_kwargs=("soft_ttl", "hard_ttl"))
+    async def get_file_metadata(self, uuid: str) -> dict:
+        request = cdn_pb2.FileRequest(uuid=uuid)
+        result = await self.stub.GetFileMetadata(request)
+        return self._metadata_codec.from_message(result)
+
+    async def get_files_metadata(self, uuids: list[str], soft_ttl: float = None,
+                                 hard_ttl: float = None) -> dict[str, dict]:
+        """Get metadata for many files with one cache read and one FilterFile call for the misses.
+
+        Stale entries are returned as is and refreshed by one background task, except the ones
+        another task is already refreshing.
+        """
+        results = {}
+        if self._local_cache is not None:
+            for uuid in uuids:
+                metadata = self._local_cache.get(uuid)
+                if metadata is not None:
+                    results[uuid] = metadata
+
+        keys = {self._make_key(uuid): uuid for uuid in uuids if uuid not in results}
+        if not keys:
+            return results
+
+        stale = []
+        cached = await self._cdn_cache.aget_many(list(keys))
+        for key, entry in cached.items():
+            metadata = self._read_metadata_entry(entry, soft_ttl, hard_ttl)
+            if isinstance(metadata, Stale):
+                stale.append(keys[key])
+                metadata = metadata.value
+            if metadata is not None:
+                results[keys[key]] = metadata
+                if self._local_cache is not None:
+                    self._local_cache.set(keys[key], metadata)
+
+        # Per uuid, so overlapping pages don't refresh the same files twice
+        refresh_keys = [("refresh_metadata", uuid) for uuid in dict.fromkeys(stale)
+                        if ("refresh_metadata", uuid) not in self._refresh_tasks]
+        if refresh_keys:
+            task = asyncio.create_task(self._fetch_files_metadata([uuid for _, uuid in refresh_keys], hard_ttl))
+            for refresh_key in refresh_keys:
+                self._refresh_tasks[refresh_key] = task
+
+            def release(_):
+                for refresh_key in refresh_keys:
+                    self._refresh_tasks.pop(refresh_key, None)
+
+            task.add_done_callback(release)
+
+        misses = [uuid for uuid in keys.values() if uuid not in results]
+        if misses:
+            results.update(await self._fetch_files_metadata(misses, hard_ttl))
+
+        return results
+
+    async def _fetch_files_metadata(self, uuids: list[str], hard_ttl: float = None) -> dict[str, dict]:
+        response = await self.stub.FilterFile(cdn_pb2.FilterFileRequest(uuid_list=uuids))
+        fetched = {message.uuid: self._metadata_codec.from_message(message)
+                   for message in response.files if message.uuid}
+        if fetched:
+            await self._cdn_cache.aset_many(
+                {self._make_key(uuid): make_entry(self._metadata_codec.encode(metadata))
+                 for uuid, metadata in fetched.items()},
+                timeout=self._metadata_entry_timeout(hard_ttl))
+            if self._local_cache is not None:
+                for uuid, metadata in fetched.items():
+                    self._local_cache.set(uuid, metadata)
+        return fetched
+
+    async def iter_file_content(self, uuid: str, offset: int = 0, length: int = 0) -> AsyncIterator[bytes]:
+        """Yield the file content chunk by chunk as it arrives from the server, optionally from
+        `offset` and for `length` bytes (0 = to the end)."""
+        request = cdn_pb2.FileRequest(uuid=uuid, offset=offset, length=length)
+        received = 0
+        async for chunk in self.stub.GetFileContent(request):
+            received += len(chunk.file_content)
+            # A server that ignores the range would send the whole file
+            if length and received > length:
+                raise Exception(f"Received more than the {length} bytes requested of file {uuid}")
+            yield chunk.file_content
+
+    async def read_range(self, uuid: str, start: int, length: int) -> bytes:
+        """Read `length` bytes of a file from byte `start`, without downloading the rest."""
+        if start < 0 or length <= 0:
+            raise Exception(f"Invalid range {start}+{length}")
+        return b"".join([content async for content in self.iter_file_content(uuid, offset=start, length=length)])
+
+    async def _write_content(self, uuid: str, path: str | Path) -> None:
+        # File writes run in a thread so a slow disk doesn't stall the event loop
+        f = await asyncio.to_thread(open, path, 'wb')
+        try:
+            async for content in self.iter_file_content(uuid):
+                await asyncio.to_thread(f.write, content)
+        finally:
+            await asyncio.to_thread(f.close)
+
+    async def download_file(self, uuid: str, output_file_path: str = None, file_name: str = None) -> str:
+        if not output_file_path:
+            metadata = await self.get_file_metadata(uuid) or {}
+            version = metadata.get("version")
+            file_name = file_name or metadata.get("file_name")
+
+            if int(metadata.get("file_size") or 0) > self._file_cache.max_bytes:
+                # Never cached, the caller gets its own copy and removes it
+                output_path = await asyncio.to_thread(self._file_cache.outside_path_for, file_name)
+                await self._write_content(uuid, output_path)
+                return str(output_path)
+
+            # The file cache touches the disk and waits for its host-wide lock, keep it off the loop too
+            cached_path = await asyncio.to_thread(self._file_cache.get, uuid, version, file_name)
+            if cached_path:
+                return cached_path
+
+            tmp_path = await asyncio.to_thread(self._file_cache.temp_path)
+            try:
+                await self._write_content(uuid, tmp_path)
+                return await asyncio.to_thread(self._file_cache.store, tmp_path, uuid, version, file_name)
+            except BaseException:
+                tmp_path.unlink(missing_ok=True)
+                raise
+
+        await self._write_content(uuid, output_file_path)
+        return output_file_path
+
+    async def check_file_status(self, uuid: str) -> dict:
+        request = cdn_pb2.FileRequest(uuid=uuid)
+        result = await self.stub.GetFileStatus(request)
+        return MessageToDict(result, preserving_proto_field_name=True)
+
+    async def assign_to_instance(self, uuid: str, content_type_id: int, object_id: int,
+                                 local_id: int | None = None) -> dict:
+        request = cdn_pb2.AssignUnassignRequest(
+            uuid=uuid,
+            service_name=self._service_name,
+            sub_service_name=self._sub_service_name,
+            content_type_id=content_type_id,
+            object_id=object_id,
+            local_id=local_id)
+        result = await self.stub.AssignToInstance(request)
+        return MessageToDict(result, preserving_proto_field_name=True)
+
+    async def unassign_from_instance(self, uuid: str, content_type_id: int, object_id: int,
+                                     local_id: int | None = None) -> dict:
+        request = cdn_pb2.AssignUnassignRequest(
+            uuid=uuid,
+            service_name=self._service_name,
+            sub_service_name=self._sub_service_name,
+            content_type_id=content_type_id,
+            object_id=object_id,
+            local_id=local_id)
+        result = await self.stub.UnassignFromInstance(request)
+        return MessageToDict(result, preserving_proto_field_name=True)
+
+    async def upload_file(self, file: bytes, file_name: str = None, user_id: int = None) -> dict:
+        request = cdn_pb2.File(file=file, file_name=file_name, service_name=self._service_name,
+                               sub_service_name=self._sub_service_name, user_id=user_id)
+        result = await self.stub.UploadFile(request)
+        return MessageToDict(result)
+
+    async def filter_file(self, service_name: str = None, sub_service_name: str = None, user_id: int = None,
+                          uuid_list: list[str] = None):
+        request = cdn_pb2.FilterFileRequest(
+            service_name=service_name,
+            sub_service_name=sub_service_name,
+            user_id=user_id,
+            uuid_list=uuid_list
+        )
+        result = await self.stub.FilterFile(request)
+        return MessageToDict(result, preserving_proto_field_name=True)
+
+    @property
+    def local_cache(self) -> LocalCache | None:
+        return self._local_cache
+
+    @property
+    def file_cache(self) -> FileCache:
+        return self._file_cache
+
+    @property
+    def service_name(self):
+        return self._service_name
+
+    @property
+    def sub_service_name(self):
+        return self._sub_service_name
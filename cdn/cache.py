@@ -0,0 +1,179 @@
+import time
+from collections import OrderedDict
+from concurrent.futures import Executor, Future
+from threading import Lock
+
+
+class LocalCache:
+    """Bounded in-process LRU cache with a per-entry TTL, used in front of the redis `cdn` cache."""
+
+    def __init__(self, max_entries: int = 1024, timeout: float = 30):
+        self.max_entries = max_entries
+        self.timeout = timeout
+        self._entries = OrderedDict()
+        self._lock = Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def get(self, key: str):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                self.misses += 1
+                return None
+
+            expires_at, value = entry
+            if expires_at <= time.monotonic():
+                del self._entries[key]
+                self.misses += 1
+                return None
+
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return value
+
+    def set(self, key: str, value) -> None:
+        with self._lock:
+            self._entries[key] = (time.monotonic() + self.timeout, value)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+
+    def delete(self, key: str) -> None:
+        with self._lock:
+            self._entries.pop(key, None)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                "size": len(self._entries),
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+            }
+
+
+class Stale:
+    """A cached value past its soft TTL, served as is while a refresh runs in the background."""
+
+    __slots__ = ("value",)
+
+    def __init__(self, value):
+        self.value = value
+
+
+def make_entry(payload) -> tuple:
+    """Wrap a value for the shared cache with the time it was fetched."""
+    return time.time(), payload
+
+
+def read_entry(entry, soft_ttl: float | None, hard_ttl: float | None):
+    """Unwrap a `make_entry` value: the payload, `Stale(payload)` past the soft TTL or None past the hard TTL.
+
+    Entries written before they carried a fetch time are of unknown age, so they count as stale
+    (when a soft TTL is set) but never as expired.
+    """
+    if entry is None:
+        return None
+    if not isinstance(entry, tuple):
+        return Stale(entry) if soft_ttl is not None else entry
+
+    fetched_at, payload = entry
+    age = time.time() - fetched_at
+    if hard_ttl is not None and age >= hard_ttl:
+        return None
+    if soft_ttl is not None and age >= soft_ttl:
+        return Stale(payload)
+    return payload
+
+
+class SingleFlight:
+    """Coalesce concurrent calls for the same key so that only one of them does the work."""
+
+    def __init__(self):
+        self._lock = Lock()
+        self._futures = {}
+
+    def do(self, key, func, *args, **kwargs):
+        with self._lock:
+            future = self._futures.get(key)
+            is_leader = future is None
+            if is_leader:
+                future = Future()
+                self._futures[key] = future
+
+        if not is_leader:
+            return future.result()
+
+        try:
+            result = func(*args, **kwargs)
+        except BaseException as err:
+            future.set_exception(err)
+            raise
+        else:
+            future.set_result(result)
+            return result
+        finally:
+            with self._lock:
+                self._futures.pop(key, None)
+
+    def do_in_background(self, key, executor: Executor, func, *args, **kwargs) -> Future:
+        """Like `do`, but run `func` on `executor`; while it runs, later calls for the key get the same future."""
+        with self._lock:
+            future = self._futures.get(key)
+            if future is not None:
+                return future
+            future = Future()
+            self._futures[key] = future
+
+        self._submit([key], future, executor, func, *args, **kwargs)
+        return future
+
+    def do_many_in_background(self, keys: list, executor: Executor, func, *args, **kwargs) -> Future | None:
+        """Run `func(claimed_keys, ...)` once on `executor` for the keys that are not in flight yet.
+
+        Returns its future, or None when every key was already in flight.
+        """
+        with self._lock:
+            claimed = [key for key in dict.fromkeys(keys) if key not in self._futures]
+            if not claimed:
+                return None
+            future = Future()
+            for key in claimed:
+                self._futures[key] = future
+
+        self._submit(claimed, future, executor, func, claimed, *args, **kwargs)
+        return future
+
+    def _submit(self, keys: list, future: Future, executor: Executor, func, *args, **kwargs) -> None:
+        def release():
+            with self._lock:
+                for key in keys:
+                    self._futures.pop(key, None)
+
+        def run():
+            try:
+                result = func(*args, **kwargs)
+            except BaseException as err:
+                future.set_exception(err)
+            else:
+                future.set_result(result)
+            finally:
+                release()
+
+        try:
+            executor.submit(run)
+        except BaseException as err:
+            future.set_exception(err)
+            release()
+            raise
+
+    def in_flight(self) -> int:
+        with self._lock:
+            return len(self._futures)
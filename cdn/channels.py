@@ -0,0 +1,110 @@
+import itertools
+from threading import Lock
+from typing import Callable
+
+import grpc
+from django.conf import settings
+
+from .proto import cdn_pb2_grpc
+
+DEFAULT_CHANNEL_OPTIONS = {
+    # Without a local subchannel pool, channels to the same target share a single connection
+    "grpc.use_local_subchannel_pool": 1,
+    "grpc.max_send_message_length": 64 * 1024 * 1024,
+    "grpc.max_receive_message_length": 64 * 1024 * 1024,
+}
+
+DEFAULT_TRANSFER_CHANNEL_OPTIONS = {
+    **DEFAULT_CHANNEL_OPTIONS,
+    # Larger initial flow-control window for content streams
+    "grpc.http2.lookahead_bytes": 4 * 1024 * 1024,
+}
+
+ROUND_ROBIN = "round_robin"
+LEAST_IN_FLIGHT = "least_in_flight"
+
+
+def get_pool_settings() -> dict:
+    return getattr(settings, "CDN_CHANNEL_POOL", None) or {}
+
+
+def get_channel_options(transfer: bool = False) -> list[tuple[str, int | str]]:
+    """Default channel options merged with the OPTIONS / TRANSFER_OPTIONS from CDN_CHANNEL_POOL."""
+    pool_settings = get_pool_settings()
+    if transfer:
+        options = {**DEFAULT_TRANSFER_CHANNEL_OPTIONS, **pool_settings.get("TRANSFER_OPTIONS", {})}
+    else:
+        options = {**DEFAULT_CHANNEL_OPTIONS, **pool_settings.get("OPTIONS", {})}
+    return list(options.items())
+
+
+class _InFlightInterceptor(grpc.UnaryUnaryClientInterceptor, grpc.UnaryStreamClientInterceptor,
+                           grpc.StreamUnaryClientInterceptor, grpc.StreamStreamClientInterceptor):
+    """Count the calls currently running on a channel."""
+
+    def __init__(self):
+        self.in_flight = 0
+        self._lock = Lock()
+
+    def _done(self, _call) -> None:
+        with self._lock:
+            self.in_flight -= 1
+
+    def _intercept(self, continuation, client_call_details, request):
+        with self._lock:
+            self.in_flight += 1
+        try:
+            call = continuation(client_call_details, request)
+        except BaseException:
+            self._done(None)
+            raise
+        call.add_done_callback(self._done)
+        return call
+
+    intercept_unary_unary = _intercept
+    intercept_unary_stream = _intercept
+    intercept_stream_unary = _intercept
+    intercept_stream_stream = _intercept
+
+
+class ChannelPool:
+    """A fixed set of channels to the CDN service, handing out stubs round-robin or by least calls in flight."""
+
+    def __init__(self, channel_factory: Callable[[list], grpc.Channel], size: int = 1, strategy: str = ROUND_ROBIN,
+                 options: list = None):
+        if strategy not in (ROUND_ROBIN, LEAST_IN_FLIGHT):
+            raise Exception(f"Unknown channel pool strategy {strategy}")
+
+        self.strategy = strategy
+        self._channels = []
+        self._interceptors = []
+        self._stubs = []
+        self._counter = itertools.count()
+
+        for _ in range(max(size, 1)):
+            channel = channel_factory(options or [])
+            interceptor = _InFlightInterceptor()
+            self._channels.append(channel)
+            self._interceptors.append(interceptor)
+            self._stubs.append(cdn_pb2_grpc.CDNServiceStub(grpc.intercept_channel(channel, interceptor)))
+
+    def __len__(self):
+        return len(self._channels)
+
+    @property
+    def channels(self) -> list[grpc.Channel]:
+        return list(self._channels)
+
+    def get_stub(self) -> cdn_pb2_grpc.CDNServiceStub:
+        if self.strategy == LEAST_IN_FLIGHT:
+            index = min(range(len(self._stubs)), key=lambda i: self._interceptors[i].in_flight)
+        else:
+            index = next(self._counter) % len(self._stubs)
+        return self._stubs[index]
+
+    def in_flight(self) -> list[int]:
+        return [interceptor.in_flight for interceptor in self._interceptors]
+
+    def close(self) -> None:
+        for channel in self._channels:
+            channel.close()
@@ -1,31 +1,52 @@
+import atexit
+import hashlib
+import mmap
+import os
+import time
 from pathlib import Path
 
 import grpc
 
+from .cache import LocalCache, SingleFlight, Stale, make_entry, read_entry
+from .codecs import get_metadata_codec
+from .channels import ChannelPool, ROUND_ROBIN, get_channel_options, get_pool_settings
 from .decorators import cdn_cache
+from .storage import FileCache
 from .proto import cdn_pb2, cdn_pb2_grpc
+from .utils import iter_file_chunks, iter_mmap_chunks
 from threading import Lock
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from typing import Callable, Iterator
 from google.protobuf.json_format import MessageToDict
 from django.conf import settings
-import tempfile
-from django.core.cache import caches
+from django.core.cache import caches, InvalidCacheBackendError
 
-SERVICE_NAME = getattr(settings, "SERVICE_NAME")
-SUB_SERVICE_NAME = getattr(settings, "SUB_SERVICE_NAME")
-
-
-def get_secure_channel(server_domain):
-    cert_path = f'cdnservice_{SERVICE_NAME}.pem'
+def get_channel_credentials():
+    service_name = getattr(settings, "SERVICE_NAME", None)
+    cert_path = f'cdnservice_{service_name}.pem'
 
     # Load server certificate
     with open(cert_path, "rb") as f:
         trusted_certs = f.read()
 
     # Create SSL/TLS credentials
-    credentials = grpc.ssl_channel_credentials(root_certificates=trusted_certs)
+    return grpc.ssl_channel_credentials(root_certificates=trusted_certs)
 
+
+def get_secure_channel(server_domain, options: list = None):
     # Create a secure channel
-    return grpc.secure_channel(server_domain, credentials)
+    return grpc.secure_channel(server_domain, get_channel_credentials(), options=options)
+
+
+def format_error(err: Exception) -> str:
+    if isinstance(err, grpc.RpcError):
+        return f"Error: {err.code()} - {err.details()}"
+    return str(err)
+
+
+# Stream errors worth resuming a download after
+RETRYABLE_STATUS_CODES = {grpc.StatusCode.UNAVAILABLE, grpc.StatusCode.DEADLINE_EXCEEDED, grpc.StatusCode.ABORTED,
+                          grpc.StatusCode.INTERNAL, grpc.StatusCode.RESOURCE_EXHAUSTED}
 
 
 def try_except(func):
@@ -45,15 +66,36 @@ def try_except(func):
 
 
 class CDNClient:
+    """Process-wide CDN client.
+
+    Creating it only reads settings; the cache, file store and gRPC channels are set up on first
+    use, so importing the package is cheap. Call `warmup()` to connect eagerly.
+    """
     _instance = None
     _lock = Lock()
     _service_name = None
     _sub_service_name = None
+    _server_address = None
     _conn_address = None
-    _cdn_cache = None
-    _cache_timeout = 60 * 60 * 24  # 24 hours default cache timeout
+    _local_cache = None
+    _file_cache = None
+    _metadata_codec = None
+    _single_flight = SingleFlight()
+    _flight_lock_timeout = None
+    _cache_timeout = 60 * 60 * 24  # 24 hours default cache timeout, the hard TTL of metadata
+    _soft_ttl = None  # metadata older than this is served stale and refreshed in the background
+    _refresh_executor_instance = None
+    _upload_chunk_size = 1024 * 1024  # 1 MiB default upload chunk size
+    _download_retries = 3  # resumes of a broken content stream per download
+    _batch_supported = True  # turned off once the server answers UNIMPLEMENTED to a batch RPC
+    _metadata_pool = None
+    _transfer_pool = None
+    _pid = None  # process that opened the current pools
 
     def __new__(cls):
+        if cls._instance is not None:
+            return cls._instance
+
         server_address = getattr(settings, "CDN_GRPC_ADDRESS", "localhost")
         service_name = getattr(settings, "SERVICE_NAME", None)
         sub_service_name = getattr(settings, "SUB_SERVICE_NAME", None)
@@ -65,24 +107,28 @@ class CDNClient:
         if not server_address:
             raise Exception("set CDN_GRPC_ADDRESS in django settings")
 
-        cls._service_name = service_name
-        cls._sub_service_name = sub_service_name
-        cls._conn_address = f"{server_address}:50051"
-
         with cls._lock:
             if cls._instance is None:
-                cls._instance = super(CDNClient, cls).__new__(cls)
+                cls._service_name = service_name
+                cls._sub_service_name = sub_service_name
+                cls._server_address = server_address
+                cls._conn_address = f"{server_address}:50051"
 
-                try:
-                    cdn_cache = caches['cdn']
-                    cls._cdn_cache = cdn_cache
-                except KeyError:
-                    raise Exception("setup new redis cache named cdn [with desired redis db] ")
+                local_cache_settings = getattr(settings, "CDN_LOCAL_CACHE", None)
+                if local_cache_settings:
+                    cls._local_cache = LocalCache(max_entries=local_cache_settings.get("MAX_ENTRIES", 1024),
+                                                  timeout=local_cache_settings.get("TIMEOUT", 30))
 
-                cls._instance.channel = get_secure_channel(server_address)
-                # cls._instance.channel = grpc.insecure_channel(cls._conn_address)
+                cls._metadata_codec = get_metadata_codec()
 
-                cls._instance.stub = cdn_pb2_grpc.CDNServiceStub(cls._instance.channel)
+                ttl_settings = getattr(settings, "CDN_METADATA_TTL", None) or {}
+                cls._soft_ttl = ttl_settings.get("SOFT", cls._soft_ttl)
+                cls._cache_timeout = ttl_settings.get("HARD", cls._cache_timeout)
+                cls._flight_lock_timeout = getattr(settings, "CDN_SINGLE_FLIGHT_LOCK_TIMEOUT", None)
+                cls._upload_chunk_size = getattr(settings, "CDN_UPLOAD_CHUNK_SIZE", cls._upload_chunk_size)
+                cls._download_retries = getattr(settings, "CDN_DOWNLOAD_RETRIES", cls._download_retries)
+
+                cls._instance = super(CDNClient, cls).__new__(cls)
 
         return cls._instance
 
@@ -90,78 +136,362 @@ class CDNClient:
         return self
 
     def __exit__(self, exc_type, exc_value, traceback):
-        self.channel.close()
+        self.close()
+
+    def _connect(self) -> None:
+        with self._lock:
+            if self._metadata_pool is not None:
+                return
+
+            # Separate pools keep large content streams from blocking metadata calls
+            pool_settings = get_pool_settings()
+            strategy = pool_settings.get("STRATEGY", ROUND_ROBIN)
+            transfer_pool = ChannelPool(
+                lambda options: get_secure_channel(self._server_address, options),
+                size=pool_settings.get("TRANSFER_SIZE", 1),
+                strategy=strategy,
+                options=get_channel_options(transfer=True))
+            CDNClient._transfer_pool = transfer_pool
+            CDNClient._metadata_pool = ChannelPool(
+                lambda options: get_secure_channel(self._server_address, options),
+                size=pool_settings.get("SIZE", 1),
+                strategy=strategy,
+                options=get_channel_options())
+            CDNClient._pid = os.getpid()
+
+    @classmethod
+    def _after_fork_in_child(cls) -> None:
+        """Forget the parent's channels and locks; the child opens its own pools on first use.
+
+        The inherited channels are dropped rather than closed, closing them from the child can hang.
+        """
+        cls._lock = Lock()
+        cls._metadata_pool = None
+        cls._transfer_pool = None
+        cls._pid = None
+        cls._single_flight = SingleFlight()
+        cls._refresh_executor_instance = None
+        if cls._local_cache is not None:
+            cls._local_cache = LocalCache(max_entries=cls._local_cache.max_entries, timeout=cls._local_cache.timeout)
+
+    def warmup(self, timeout: float = None) -> None:
+        """Resolve the caches and open every channel now instead of on first use."""
+        self._cdn_cache.get(self._make_key("warmup"))
+        self.file_cache  # creates the store directory
+        self._connect()
+        for channel in self._metadata_pool.channels + self._transfer_pool.channels:
+            grpc.channel_ready_future(channel).result(timeout=timeout)
+
+    def close(self) -> None:
+        with self._lock:
+            if self._pid == os.getpid():
+                for pool in (self._metadata_pool, self._transfer_pool):
+                    if pool is not None:
+                        pool.close()
+            CDNClient._metadata_pool = None
+            CDNClient._transfer_pool = None
+            CDNClient._pid = None
 
-    def _make_key(self, image_id: str) -> str:
-        """Make a namespaced cache key."""
-        return f"cdn:{image_id}"
+    @property
+    def _cdn_cache(self):
+        try:
+            return caches['cdn']
+        except InvalidCacheBackendError:
+            raise Exception("setup new redis cache named cdn [with desired redis db] ")
 
-    def _get_metadata(self, image_id: str) -> dict | None:
-        """Get metadata for an image_id."""
-        key = self._make_key(image_id)
-        return self._cdn_cache.get(key)
+    def _check_pid(self) -> None:
+        # Fallback for forks that bypass os.register_at_fork hooks
+        if self._pid is not None and self._pid != os.getpid():
+            self._after_fork_in_child()
 
-    def _set_metadata(self, image_id: str, metadata: dict) -> None:
-        """Set or overwrite metadata for an image_id."""
-        key = self._make_key(image_id)
-        self._cdn_cache.set(key, metadata, timeout=self._cache_timeout)
+    @property
+    def stub(self) -> cdn_pb2_grpc.CDNServiceStub:
+        """Stub for small unary calls."""
+        self._check_pid()
+        if self._metadata_pool is None:
+            self._connect()
+        return self._metadata_pool.get_stub()
 
-    def _get_last_temp(self, image_id: str) -> str | None:
-        """Get downloaded path for an image_id."""
-        key = self._make_key(image_id)
-        result = self._cdn_cache.get(key)
-        if result:
-            path = result.get('temp_path', None)
-            if path and Path(path).exists():
-                return path
-            return None
-        return None
-
-    def _update_temp_path(self, image_id: str, temp_path: str) -> None:
-        """Update only temp_path field for an existing metadata."""
-        key = self._make_key(image_id)
-        metadata = self._cdn_cache.get(key)
+    @property
+    def transfer_stub(self) -> cdn_pb2_grpc.CDNServiceStub:
+        """Stub for file content uploads and downloads."""
+        self._check_pid()
+        if self._transfer_pool is None:
+            self._connect()
+        return self._transfer_pool.get_stub()
 
-        if metadata is None:
-            # If no metadata exists, create a new one
-            metadata = {}
+    @property
+    def _refresh_executor(self) -> ThreadPoolExecutor:
+        """Runs background refreshes of stale metadata."""
+        with self._lock:
+            if CDNClient._refresh_executor_instance is None:
+                CDNClient._refresh_executor_instance = ThreadPoolExecutor(max_workers=2,
+                                                                          thread_name_prefix="cdn-refresh")
+            return CDNClient._refresh_executor_instance
 
-        metadata['temp_path'] = temp_path
-        self._cdn_cache.set(key, metadata, timeout=self._cache_timeout)
+    def _make_key(self, image_id: str) -> str:
+        """Make a namespaced cache key."""
+        # v2 entries are `make_entry` tuples, workers still reading plain values keep using cdn:{image_id}
+        return f"cdn:v2:{image_id}"
+
+    def _read_metadata_entry(self, entry, soft_ttl: float = None, hard_ttl: float = None):
+        result = read_entry(entry,
+                            soft_ttl=self._soft_ttl if soft_ttl is None else soft_ttl,
+                            hard_ttl=self._cache_timeout if hard_ttl is None else hard_ttl)
+        if isinstance(result, Stale):
+            return Stale(self._metadata_codec.decode(result.value))
+        return self._metadata_codec.decode(result)
+
+    def _metadata_entry_timeout(self, hard_ttl: float = None) -> float:
+        # Shorter per call hard TTLs are checked on read, the entry lives as long as the longest one
+        return max(self._cache_timeout, hard_ttl or 0)
+
+    def _get_metadata(self, image_id: str, soft_ttl: float = None, hard_ttl: float = None) -> dict | Stale | None:
+        """Get metadata for an image_id, `Stale(metadata)` once it is older than the soft TTL."""
+        key = self._make_key(image_id)
+        return self._read_metadata_entry(self._cdn_cache.get(key), soft_ttl, hard_ttl)
 
-    @cdn_cache(_get_metadata, _set_metadata)
+    def _set_metadata(self, image_id: str, metadata: dict, soft_ttl: float = None, hard_ttl: float = None) -> None:
+        """Set or overwrite metadata for an image_id."""
+        key = self._make_key(image_id)
+        self._cdn_cache.set(key, make_entry(self._metadata_codec.encode(metadata)),
+                            timeout=self._metadata_entry_timeout(hard_ttl))
+        if self._local_cache is not None:
+            self._local_cache.set(image_id, metadata)
+
+    def invalidate_metadata(self, image_id: str) -> None:
+        """Drop cached metadata for an image_id from both cache tiers."""
+        # Including the key older workers read, while they are still around
+        self._cdn_cache.delete_many([self._make_key(image_id), f"cdn:{image_id}"])
+        if self._local_cache is not None:
+            self._local_cache.delete(image_id)
+
+    @cdn_cache(_get_metadata, _set_metadata, use_local_cache=True, cache_kwargs=("soft_ttl", "hard_ttl"))
     def get_file_metadata(self, uuid: str) -> dict:
+        """Metadata of a file, cached. `soft_ttl` / `hard_ttl` keyword arguments override the
+        CDN_METADATA_TTL defaults for this call."""
         request = cdn_pb2.FileRequest(uuid=uuid)
         result = self.stub.GetFileMetadata(request)
-        return MessageToDict(result, preserving_proto_field_name=True)
+        return self._metadata_codec.from_message(result)
+
+    def get_files_metadata(self, uuids: list[str], soft_ttl: float = None, hard_ttl: float = None) -> dict[str, dict]:
+        """Get metadata for many files with one cache read and one FilterFile call for the misses.
+
+        Stale entries are returned as is and refreshed with one background FilterFile call for the
+        ones no other refresh is already fetching.
+        """
+        results = {}
+        if self._local_cache is not None:
+            for uuid in uuids:
+                metadata = self._local_cache.get(uuid)
+                if metadata is not None:
+                    results[uuid] = metadata
+
+        keys = {self._make_key(uuid): uuid for uuid in uuids if uuid not in results}
+        if not keys:
+            return results
+
+        stale = []
+        cached = self._cdn_cache.get_many(list(keys))
+        for key, entry in cached.items():
+            metadata = self._read_metadata_entry(entry, soft_ttl, hard_ttl)
+            if isinstance(metadata, Stale):
+                stale.append(keys[key])
+                metadata = metadata.value
+            if metadata is not None:
+                results[keys[key]] = metadata
+                if self._local_cache is not None:
+                    self._local_cache.set(keys[key], metadata)
+
+        if stale:
+            # Per uuid, so overlapping pages don't refresh the same files twice
+            self._single_flight.do_many_in_background([("refresh_metadata", uuid) for uuid in stale],
+                                                      self._refresh_executor, self._refresh_files_metadata, hard_ttl)
+
+        misses = [uuid for uuid in keys.values() if uuid not in results]
+        if misses:
+            results.update(self._fetch_files_metadata(misses, hard_ttl))
+
+        return results
+
+    def _refresh_files_metadata(self, flight_keys: list[tuple], hard_ttl: float = None) -> dict[str, dict]:
+        return self._fetch_files_metadata([uuid for _, uuid in flight_keys], hard_ttl)
+
+    def _fetch_files_metadata(self, uuids: list[str], hard_ttl: float = None) -> dict[str, dict]:
+        response = self.stub.FilterFile(cdn_pb2.FilterFileRequest(uuid_list=uuids))
+        fetched = {message.uuid: self._metadata_codec.from_message(message)
+                   for message in response.files if message.uuid}
+        if fetched:
+            self._cdn_cache.set_many({self._make_key(uuid): make_entry(self._metadata_codec.encode(metadata))
+                                      for uuid, metadata in fetched.items()},
+                                     timeout=self._metadata_entry_timeout(hard_ttl))
+            if self._local_cache is not None:
+                for uuid, metadata in fetched.items():
+                    self._local_cache.set(uuid, metadata)
+        return fetched
+
+    def iter_file_content(self, uuid: str, offset: int = 0, length: int = 0) -> Iterator[bytes]:
+        """Yield the file content chunk by chunk as it arrives from the server, optionally from
+        `offset` and for `length` bytes (0 = to the end)."""
+        request = cdn_pb2.FileRequest(uuid=uuid, offset=offset, length=length)
+        received = 0
+        for chunk in self.transfer_stub.GetFileContent(request):
+            received += len(chunk.file_content)
+            # A server that ignores the range would send the whole file
+            if length and received > length:
+                raise Exception(f"Received more than the {length} bytes requested of file {uuid}")
+            yield chunk.file_content
+
+    def read_range(self, uuid: str, start: int, length: int) -> bytes:
+        """Read `length` bytes of a file from byte `start`, without downloading the rest."""
+        if start < 0 or length <= 0:
+            raise Exception(f"Invalid range {start}+{length}")
+        return b"".join(self.iter_file_content(uuid, offset=start, length=length))
+
+    def _download_resumable(self, uuid: str, partial_path: Path, metadata: dict) -> None:
+        """Stream a file into `partial_path`, continuing after the bytes already in it.
+
+        A broken stream is resumed from the current offset up to `_download_retries` times, and the
+        content is hashed as it is written so it is never read back to check the checksum. On
+        failure the partial file is kept for the next attempt, unless it is empty or its content
+        turned out wrong.
+        """
+        file_size = int(metadata["file_size"]) if metadata.get("file_size") else None
+        checksum = metadata.get("checksum")
+        hasher = hashlib.sha256()
+
+        partial_path.parent.mkdir(parents=True, exist_ok=True)
+        offset = 0
+        try:
+            with open(partial_path, 'a+b') as f:
+                # Seed the hash with what a previous attempt left behind
+                f.seek(0)
+                for block in iter(lambda: f.read(1024 * 1024), b""):
+                    hasher.update(block)
+                    offset += len(block)
+                if offset:
+                    print(f"Resuming download of {uuid} at byte {offset}")
+
+                attempt = 0
+                while file_size is None or offset < file_size:
+                    try:
+                        for content in self.iter_file_content(uuid, offset=offset):
+                            f.write(content)
+                            hasher.update(content)
+                            offset += len(content)
+                        break
+                    except grpc.RpcError as err:
+                        if err.code() not in RETRYABLE_STATUS_CODES or attempt >= self._download_retries:
+                            raise
+                        attempt += 1
+                        print(f"Download of {uuid} interrupted at byte {offset}, resuming "
+                              f"({attempt}/{self._download_retries}), err: {format_error(err)}")
+                        f.flush()
+                        time.sleep(min(0.1 * 2 ** attempt, 2))
+        except BaseException:
+            # Nothing to resume from, don't leave an empty partial file behind
+            if not offset:
+                partial_path.unlink(missing_ok=True)
+            raise
+
+        if file_size is not None and offset != file_size:
+            if offset > file_size or not offset:
+                partial_path.unlink(missing_ok=True)
+            raise Exception(f"Downloaded {offset} of {file_size} bytes of file {uuid}")
+        if checksum and hasher.hexdigest() != checksum:
+            partial_path.unlink(missing_ok=True)
+            raise Exception(f"Checksum mismatch for file {uuid}")
+
+    def _download_to_path(self, uuid: str, output_file_path: str | Path, metadata: dict) -> str:
+        partial_path = Path(f"{output_file_path}.partial")
+        self._download_resumable(uuid, partial_path, metadata)
+        os.replace(partial_path, output_file_path)
+        return str(output_file_path)
 
-    @cdn_cache(_get_last_temp, _update_temp_path)
     def download_file(self, uuid: str, output_file_path: str = None, file_name: str = None) -> str:
-        request = cdn_pb2.FileRequest(uuid=uuid)
+        """Download a file to `output_file_path`, or into the file cache and return its path there.
 
-        if not output_file_path:
-            with tempfile.NamedTemporaryFile(delete=False, suffix=f"_{file_name}") as temp_file:
+        A file larger than the file cache is downloaded by each call into its own temporary
+        directory, which the caller removes.
+        """
+        if output_file_path:
+            self._download_to_path(uuid, output_file_path, self.get_file_metadata(uuid) or {})
+            print(f"File downloaded to {output_file_path}")
+            return output_file_path
 
-                temp_file_path = temp_file.name
+        metadata = self.get_file_metadata(uuid) or {}
+        version = metadata.get("version")
+        file_name = file_name or metadata.get("file_name")
+
+        if int(metadata.get("file_size") or 0) > self.file_cache.max_bytes:
+            # Never cached, so there is nothing to wait for: every caller streams its own copy, which it removes
+            file_path = self._download_to_path(uuid, self.file_cache.outside_path_for(file_name), metadata)
+            print(f"File larger than the file cache downloaded to {file_path}")
+            return file_path
+
+        # Concurrent downloads of the same file version share one stream
+        return self._single_flight.do(("download_file", uuid, version), self._download_to_file_cache,
+                                      uuid, version, file_name, metadata)
+
+    def _download_to_file_cache(self, uuid: str, version: str | None, file_name: str | None,
+                                metadata: dict) -> str:
+        cached_path = self.file_cache.get(uuid, version, file_name)
+        if cached_path:
+            return cached_path
+
+        # One process per host streams a file version, the others wait here and then find it cached
+        with self.file_cache.download_lock(uuid, version, file_name):
+            cached_path = self.file_cache.get(uuid, version, file_name)
+            if cached_path:
+                return cached_path
+
+            try:
+                self._download_resumable(uuid, self.file_cache.partial_path_for(uuid, version, file_name), metadata)
+                file_path = self.file_cache.commit_partial(uuid, version, file_name)
+            except Exception as e:
+                print(f"Error during file download: {e}")
+                raise
+
+        print(f"File downloaded to file cache: {file_path}")
+        return file_path
+
+    def download_many(self, uuids: list[str], dest_dir: str | Path, max_concurrency: int = 8,
+                      progress: Callable[[int, int, str], None] = None) -> dict[str, dict]:
+        """Download many files into `dest_dir`, streaming up to `max_concurrency` of them at once.
+
+        Returns `{uuid: {"path": ...}}` or `{uuid: {"error": ...}}` per file. `progress` is called
+        with (completed, total, uuid) each time a file finishes.
+        """
+        dest_dir = Path(dest_dir)
+        dest_dir.mkdir(parents=True, exist_ok=True)
+        uuids = list(dict.fromkeys(str(uuid) for uuid in uuids))
 
+        try:
+            metadata_by_uuid = self.get_files_metadata(uuids)
+        except Exception as err:
+            print(f"Error fetching metadata for bulk download: {err}")
+            metadata_by_uuid = {}
+
+        def download(uuid: str) -> str:
+            metadata = metadata_by_uuid.get(uuid) or {}
+            file_name = Path(metadata.get("file_name") or "file").name
+            return self._download_to_path(uuid, dest_dir / f"{uuid}_{file_name}", metadata)
+
+        results = {}
+        with ThreadPoolExecutor(max_workers=max_concurrency) as executor:
+            futures = {executor.submit(download, uuid): uuid for uuid in uuids}
+            for future in as_completed(futures):
+                uuid = futures[future]
                 try:
-                    # Write chunks to the temporary file
-                    for chunk in self.stub.GetFileContent(request):
-                        temp_file.write(chunk.file_content)
-
-                    print(f"File downloaded to temporary file: {temp_file_path}")
-                    return temp_file_path  # Return the temp file path
-                except Exception as e:
-                    print(f"Error during file download: {e}")
-                    raise
-
-        else:
-            with open(output_file_path, 'wb') as f:
+                    results[uuid] = {"path": future.result()}
+                except Exception as err:
+                    error_message = format_error(err)
+                    print(f"Error during file download: {error_message}")
+                    results[uuid] = {"error": error_message}
+                if progress:
+                    progress(len(results), len(uuids), uuid)
 
-                for chunk in self.stub.GetFileContent(request):
-                    f.write(chunk.file_content)
-            print(f"File downloaded to {output_file_path}")
-            return output_file_path
+        return results
 
     def check_file_status(self, uuid: str) -> dict:
         request = cdn_pb2.FileRequest(uuid=uuid)
@@ -171,8 +501,8 @@ class CDNClient:
     def assign_to_instance(self, uuid: str, content_type_id: int, object_id: int, local_id: int | None = None) -> dict:
         request = cdn_pb2.AssignUnassignRequest(
             uuid=uuid,
-            service_name=SERVICE_NAME,
-            sub_service_name=SUB_SERVICE_NAME,
+            service_name=self._service_name,
+            sub_service_name=self._sub_service_name,
             content_type_id=content_type_id,
             object_id=object_id,
             local_id=local_id)
@@ -183,21 +513,124 @@ class CDNClient:
                                local_id: int | None = None) -> dict:
         request = cdn_pb2.AssignUnassignRequest(
             uuid=uuid,
-            service_name=SERVICE_NAME,
-            sub_service_name=SUB_SERVICE_NAME,
+            service_name=self._service_name,
+            sub_service_name=self._sub_service_name,
             content_type_id=content_type_id,
             object_id=object_id,
             local_id=local_id)
         result = self.stub.UnassignFromInstance(request)
         return MessageToDict(result, preserving_proto_field_name=True)
 
+    def batch_assign(self, items: list[dict], check_availability: bool = True, max_concurrency: int = 8) -> list[dict]:
+        """Assign many files in one BatchAssign call.
+
+        `items` are dicts with uuid, content_type_id, object_id and an optional local_id. Returns one
+        `{"uuid", "local_id", "is_done", "message"}` dict per item, in the same order, and raises
+        if the server's results don't line up with the items.
+        """
+        return self._batch_assign_unassign("BatchAssign", self.assign_to_instance, items, check_availability,
+                                           max_concurrency)
+
+    def batch_unassign(self, items: list[dict], check_availability: bool = True,
+                       max_concurrency: int = 8) -> list[dict]:
+        """Unassign many files in one BatchUnassign call, see `batch_assign`."""
+        return self._batch_assign_unassign("BatchUnassign", self.unassign_from_instance, items, check_availability,
+                                           max_concurrency)
+
+    def _batch_assign_unassign(self, method_name: str, single_call, items: list[dict], check_availability: bool,
+                               max_concurrency: int) -> list[dict]:
+        if not items:
+            return []
+
+        if CDNClient._batch_supported:
+            request = cdn_pb2.BatchAssignUnassignRequest(
+                items=[cdn_pb2.AssignUnassignRequest(service_name=self._service_name,
+                                                     sub_service_name=self._sub_service_name,
+                                                     **item) for item in items],
+                check_availability=check_availability)
+            try:
+                response = getattr(self.stub, method_name)(request)
+            except grpc.RpcError as err:
+                if err.code() != grpc.StatusCode.UNIMPLEMENTED:
+                    raise
+                print(f"{method_name} is not supported by the server, falling back to single calls")
+                CDNClient._batch_supported = False
+            else:
+                # Callers pair results with their items by position
+                if len(response.results) != len(items) or \
+                        any(result.uuid != str(item["uuid"]) for result, item in zip(response.results, items)):
+                    raise Exception(f"{method_name} returned {len(response.results)} results that don't match "
+                                    f"the {len(items)} items requested")
+                return [{"uuid": result.uuid, "local_id": result.local_id or None, "is_done": result.is_done,
+                         "message": result.message} for result in response.results]
+
+        def run(item: dict) -> dict:
+            result = {"uuid": item["uuid"], "local_id": item.get("local_id"), "is_done": False, "message": ""}
+            try:
+                if check_availability and not self.check_file_status(uuid=item["uuid"]).get("is_available"):
+                    result["message"] = "File Not Found!"
+                    return result
+                response = single_call(**item)
+                result.update(is_done=True, message=response.get("message", ""))
+            except Exception as err:
+                result["message"] = format_error(err)
+            return result
+
+        with ThreadPoolExecutor(max_workers=min(max_concurrency, len(items))) as executor:
+            return list(executor.map(run, items))
+
     def upload_file(self, file: bytes, file_name: str, service_name: str, app_name: str, model_name: str) -> dict:
 
         request = cdn_pb2.File(file=file, file_name=file_name, service_name=service_name, app_name=app_name,
                                model_name=model_name)
-        result = self.stub.UploadFile(request)
+        result = self.transfer_stub.UploadFile(request)
+        return MessageToDict(result)
+
+    def upload_file_stream(self, file, file_name: str = None, user_id: int = None, chunk_size: int = None) -> dict:
+        """Upload from a path, a django UploadedFile or a file-like object without loading it whole.
+
+        Only one chunk is held in memory at a time, and the upload isn't capped by the gRPC message size.
+        """
+        if file_name is None:
+            file_name = Path(file).name if isinstance(file, (str, Path)) else Path(getattr(file, 'name', '')).name
+        chunks = iter_file_chunks(file, chunk_size or self._upload_chunk_size)
+        result = self.transfer_stub.UploadFileStream(self._iter_upload_requests(chunks, file_name, user_id))
         return MessageToDict(result)
 
+    def upload_path(self, path: str | Path, file_name: str = None, user_id: int = None,
+                    chunk_size: int = None) -> dict:
+        """Upload a local file by memory-mapping it and streaming slices of the mapping.
+
+        Pages are released as soon as their chunk is sent, so peak memory stays flat for files of any size.
+        """
+        path = Path(path)
+        file_name = file_name or path.name
+        with open(path, 'rb') as f:
+            # Empty files can't be mapped, they are sent as the single metadata message
+            if os.fstat(f.fileno()).st_size == 0:
+                result = self.transfer_stub.UploadFileStream(self._iter_upload_requests(iter(()), file_name, user_id))
+                return MessageToDict(result)
+
+            with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mapping:
+                chunks = iter_mmap_chunks(mapping, chunk_size or self._upload_chunk_size)
+                result = self.transfer_stub.UploadFileStream(self._iter_upload_requests(chunks, file_name, user_id))
+        return MessageToDict(result)
+
+    def _iter_upload_requests(self, chunks: Iterator[bytes], file_name: str, user_id: int | None):
+        first = cdn_pb2.File(file_name=file_name, service_name=self._service_name,
+                             sub_service_name=self._sub_service_name, user_id=user_id)
+        for chunk in chunks:
+            if first is not None:
+                first.file = chunk
+                yield first
+                first = None
+            else:
+                yield cdn_pb2.File(file=chunk)
+
+        # Empty files still need the metadata message
+        if first is not None:
+            yield first
+
     def filter_file(self, service_name: str = None, sub_service_name: str = None, user_id: int = None,
                     uuid_list: list[str] = None):
         request = cdn_pb2.FilterFileRequest(
@@ -209,6 +642,16 @@ class CDNClient:
         result = self.stub.FilterFile(request)
         return MessageToDict(result, preserving_proto_field_name=True)
 
+    @property
+    def local_cache(self) -> LocalCache | None:
+        return self._local_cache
+
+    @property
+    def file_cache(self) -> FileCache:
+        if self._file_cache is None:
+            CDNClient._file_cache = FileCache.from_settings()
+        return self._file_cache
+
     @property
     def service_name(self):
         return self._service_name
@@ -216,3 +659,13 @@ class CDNClient:
     @property
     def sub_service_name(self):
         return self._sub_service_name
+
+
+def _close_client_at_exit() -> None:
+    if CDNClient._instance is not None:
+        CDNClient._instance.close()
+
+
+if hasattr(os, "register_at_fork"):
+    os.register_at_fork(after_in_child=CDNClient._after_fork_in_child)
+atexit.register(_close_client_at_exit)
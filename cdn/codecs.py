@@ -0,0 +1,117 @@
+from collections.abc import Mapping
+
+from django.conf import settings
+from google.protobuf.descriptor import FieldDescriptor
+from google.protobuf.json_format import MessageToDict, ParseDict
+
+from .proto import cdn_pb2
+
+PICKLE = "pickle"
+PROTOBUF = "protobuf"
+
+# MessageToDict renders 64 bit integers as strings
+_INT64_TYPES = {FieldDescriptor.TYPE_INT64, FieldDescriptor.TYPE_UINT64, FieldDescriptor.TYPE_SINT64,
+                FieldDescriptor.TYPE_FIXED64, FieldDescriptor.TYPE_SFIXED64}
+
+
+class MetadataView(Mapping):
+    """Read-only mapping over a serialized FileMetadataResponse, with the same keys and values as
+    `MessageToDict(..., preserving_proto_field_name=True)`. The bytes are parsed on first access and
+    each field is converted only when it is read."""
+
+    __slots__ = ("data", "_message", "_dict")
+
+    _fields = cdn_pb2.FileMetadataResponse.DESCRIPTOR.fields_by_name
+
+    def __init__(self, data: bytes):
+        self.data = data
+        self._message = None
+        self._dict = None
+
+    def _decoded(self):
+        if self._message is None:
+            self._message = cdn_pb2.FileMetadataResponse.FromString(self.data)
+        return self._message
+
+    def __getitem__(self, key):
+        if self._dict is not None:
+            return self._dict[key]
+
+        field = self._fields.get(key)
+        if field is None:
+            raise KeyError(key)
+
+        message = self._decoded()
+        # Like MessageToDict, leave out fields that are unset / at their default value
+        if field.has_presence:
+            if not message.HasField(key):
+                raise KeyError(key)
+            value = getattr(message, key)
+        else:
+            value = getattr(message, key)
+            if value == field.default_value:
+                raise KeyError(key)
+        return str(value) if field.type in _INT64_TYPES else value
+
+    def _as_dict(self) -> dict:
+        # Iterating converts every field, so do it once and keep the result
+        if self._dict is None:
+            self._dict = {field.name: str(value) if field.type in _INT64_TYPES else value
+                          for field, value in self._decoded().ListFields()}
+        return self._dict
+
+    def __iter__(self):
+        return iter(self._as_dict())
+
+    def __len__(self):
+        return len(self._as_dict())
+
+    def __repr__(self):
+        return f"MetadataView({self._as_dict()!r})"
+
+    def __reduce__(self):
+        return MetadataView, (self.data,)
+
+
+class PickleCodec:
+    """Default, caches the MessageToDict output (pickled by the cache backend)."""
+
+    def from_message(self, message) -> dict:
+        return MessageToDict(message, preserving_proto_field_name=True)
+
+    def encode(self, metadata):
+        return metadata
+
+    def decode(self, value):
+        # Entries written by the protobuf codec stay readable after switching back
+        if isinstance(value, bytes):
+            return MetadataView(value)
+        return value
+
+
+class ProtobufCodec:
+    """Caches the serialized FileMetadataResponse bytes and reads them back as a `MetadataView`."""
+
+    def from_message(self, message) -> MetadataView:
+        return MetadataView(message.SerializeToString())
+
+    def encode(self, metadata) -> bytes:
+        if isinstance(metadata, MetadataView):
+            return metadata.data
+        message = ParseDict(dict(metadata), cdn_pb2.FileMetadataResponse(), ignore_unknown_fields=True)
+        return message.SerializeToString()
+
+    def decode(self, value):
+        # Entries written by the pickle codec stay readable while the cache turns over
+        if isinstance(value, bytes):
+            return MetadataView(value)
+        return value
+
+
+def get_metadata_codec():
+    codec = getattr(settings, "CDN_CACHE_CODEC", PICKLE)
+    if codec == PICKLE:
+        return PickleCodec()
+    if codec == PROTOBUF:
+        return ProtobufCodec()
+    raise Exception(f"Unknown CDN_CACHE_CODEC {codec}, use '{PICKLE}' or '{PROTOBUF}'")
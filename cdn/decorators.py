@@ -1,24 +1,148 @@
+import asyncio
+import os
+import time
 from functools import wraps
 
+from .cache import Stale
+
+
+def _fresh(result):
+    # A stale hit does not count when a flight is about to reload the value
+    return None if isinstance(result, Stale) else result
+
+
+def _wait_for_flight(self, uuid: str, cache_get_function, lock_key: str, lock_timeout: float, cache_options: dict):
+    """Poll the shared cache until another process holding `lock_key` fills it, or the lock goes away."""
+    deadline = time.monotonic() + lock_timeout
+    while time.monotonic() < deadline:
+        result = _fresh(cache_get_function(self, uuid, **cache_options))
+        if result is not None:
+            return result
+        if self._cdn_cache.get(lock_key) is None:
+            return _fresh(cache_get_function(self, uuid, **cache_options))
+        time.sleep(0.05)
+    return None
+
+
+def cdn_cache(cache_get_function, cache_set_function, use_local_cache: bool = False, cache_kwargs: tuple = ()):
+    """Cache a `method(self, uuid, ...)` in the client's local and shared caches.
+
+    Keyword arguments named in `cache_kwargs` (e.g. per call TTLs) are passed to the cache
+    functions instead of the method. A cache get function may return `Stale(value)`: the value is
+    returned right away and the method runs once in the background to refresh it.
+    """
 
-def cdn_cache(cache_get_function, cache_set_function):
     def decorator(func):
+        def load(self, uuid: str, cache_options: dict, *args, **kwargs):
+            # Another flight may have filled the cache while we were queued
+            result = _fresh(cache_get_function(self, uuid, **cache_options))
+            if result is not None:
+                return result
+
+            # Optionally coordinate with other processes through a short lock in the shared cache
+            lock_timeout = self._flight_lock_timeout
+            lock_key = f"cdn:lock:{func.__name__}:{uuid}"
+            has_lock = False
+            if lock_timeout:
+                has_lock = self._cdn_cache.add(lock_key, os.getpid(), timeout=lock_timeout)
+                if not has_lock:
+                    result = _wait_for_flight(self, uuid, cache_get_function, lock_key, lock_timeout, cache_options)
+                    if result is not None:
+                        return result
+
+            try:
+                # Otherwise, call the real function
+                result = func(self, uuid, *args, **kwargs)
+
+                # Optionally set result to cache
+                if result is not None:
+                    cache_set_function(self, uuid, result, **cache_options)
+            finally:
+                if has_lock:
+                    self._cdn_cache.delete(lock_key)
+
+            return result
+
+        def report_refresh(uuid: str, future) -> None:
+            if future.exception() is not None:
+                print(f"{func.__name__} refresh of {uuid} unsuccessful, err: {future.exception()}")
+
         @wraps(func)
         def wrapper(self, uuid: str, *args, **kwargs):
-            # Try to get from cache first
-            result = cache_get_function(self, uuid)
+            cache_options = {name: kwargs.pop(name) for name in cache_kwargs if name in kwargs}
+
+            # Try the in-process tier first, when the client has one configured
+            local_cache = self._local_cache if use_local_cache else None
+            if local_cache is not None:
+                result = local_cache.get(uuid)
+                if result is not None:
+                    return result
+
+            # Concurrent misses and refreshes for the same call share one flight
+            flight_key = (func.__name__, uuid, args, tuple(sorted(kwargs.items())))
+
+            # Then the shared cache
+            result = cache_get_function(self, uuid, **cache_options)
+            if isinstance(result, Stale):
+                future = self._single_flight.do_in_background(flight_key, self._refresh_executor, load, self, uuid,
+                                                               cache_options, *args, **kwargs)
+                future.add_done_callback(lambda f: report_refresh(uuid, f))
+                result = result.value
             if result is not None:
+                if local_cache is not None:
+                    local_cache.set(uuid, result)
                 return result
 
-            # Otherwise, call the real function
-            result = func(self, uuid, *args, **kwargs)
+            return self._single_flight.do(flight_key, load, self, uuid, cache_options, *args, **kwargs)
 
-            # Optionally set result to cache
-            if result is not None:
-                cache_set_function(self, uuid, result)
+        return wrapper
+
+    return decorator
 
+
+def async_cdn_cache(cache_get_function, cache_set_function, use_local_cache: bool = False, cache_kwargs: tuple = ()):
+    """Same as `cdn_cache`, for coroutine methods with coroutine cache functions.
+
+    Stale values are refreshed by one task per key, kept in `self._refresh_tasks`.
+    """
+
+    def decorator(func):
+        async def load(self, uuid: str, cache_options: dict, *args, **kwargs):
+            result = await func(self, uuid, *args, **kwargs)
+            if result is not None:
+                await cache_set_function(self, uuid, result, **cache_options)
             return result
 
+        def refresh_done(self, refresh_key, task: asyncio.Task) -> None:
+            self._refresh_tasks.pop(refresh_key, None)
+            if not task.cancelled() and task.exception() is not None:
+                print(f"{func.__name__} refresh of {refresh_key[1]} unsuccessful, err: {task.exception()}")
+
+        @wraps(func)
+        async def wrapper(self, uuid: str, *args, **kwargs):
+            cache_options = {name: kwargs.pop(name) for name in cache_kwargs if name in kwargs}
+
+            local_cache = self._local_cache if use_local_cache else None
+            if local_cache is not None:
+                result = local_cache.get(uuid)
+                if result is not None:
+                    return result
+
+            result = await cache_get_function(self, uuid, **cache_options)
+            if isinstance(result, Stale):
+                refresh_key = (func.__name__, uuid, args, tuple(sorted(kwargs.items())))
+                if refresh_key not in self._refresh_tasks:
+                    task = asyncio.create_task(load(self, uuid, cache_options, *args, **kwargs))
+                    self._refresh_tasks[refresh_key] = task
+                    task.add_done_callback(lambda t: refresh_done(self, refresh_key, t))
+                result = result.value
+            if result is not None:
+                if local_cache is not None:
+                    local_cache.set(uuid, result)
+                return result
+
+            return await load(self, uuid, cache_options, *args, **kwargs)
+
         return wrapper
 
     return decorator
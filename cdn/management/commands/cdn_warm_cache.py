@@ -0,0 +1,138 @@
+import time
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+
+from django.apps import apps
+from django.core.management.base import BaseCommand, CommandError
+
+from cdn.client import CDNClient, format_error
+from cdn.models import SingleFileAssociationMixin, MultipleFileAssociationMixin
+
+
+def get_association_models(labels: list[str] = None) -> list:
+    """Concrete models using one of the file association mixins, optionally limited to `app_label.Model` labels."""
+    models = [model for model in apps.get_models()
+              if issubclass(model, (SingleFileAssociationMixin, MultipleFileAssociationMixin))
+              and not model._meta.proxy]
+    if labels:
+        wanted = {label.lower() for label in labels}
+        models = [model for model in models if model._meta.label_lower in wanted]
+        missing = wanted - {model._meta.label_lower for model in models}
+        if missing:
+            raise CommandError(f"Not a file association model: {', '.join(sorted(missing))}")
+    return models
+
+
+def iter_model_uuids(model, chunk_size: int):
+    """Stream the file uuids referenced by every row of `model`."""
+    queryset = model._default_manager.all()
+    if issubclass(model, SingleFileAssociationMixin):
+        for file in queryset.exclude(file=None).values_list("file", flat=True).iterator(chunk_size=chunk_size):
+            yield str(file)
+    else:
+        for files_local_ids in queryset.values_list("files_local_ids", flat=True).iterator(chunk_size=chunk_size):
+            for file in (files_local_ids or {}).values():
+                yield str(file)
+
+
+class Command(BaseCommand):
+    help = "Fill the cdn metadata cache for every file referenced by the file association models."
+
+    def add_arguments(self, parser):
+        parser.add_argument("models", nargs="*", metavar="app_label.Model",
+                            help="Only warm these models (default: every file association model).")
+        parser.add_argument("--batch-size", type=int, default=500, help="uuids per FilterFile call.")
+        parser.add_argument("--chunk-size", type=int, default=2000, help="Rows fetched per database round trip.")
+        parser.add_argument("--concurrency", type=int, default=4, help="FilterFile calls in flight at once.")
+        parser.add_argument("--max-rate", type=float, default=0,
+                            help="Maximum FilterFile calls started per second (0 for no limit).")
+        parser.add_argument("--refresh", action="store_true",
+                            help="Fetch every file again instead of only the ones missing from the cache.")
+
+    def handle(self, *args, **options):
+        batch_size = options["batch_size"]
+        concurrency = options["concurrency"]
+        if batch_size < 1 or concurrency < 1:
+            raise CommandError("--batch-size and --concurrency must be at least 1")
+        interval = 1 / options["max_rate"] if options["max_rate"] > 0 else 0
+        hard_ttl = 0 if options["refresh"] else None
+
+        client = CDNClient()
+        self.stats = {"files": 0, "resolved": 0, "not_found": 0, "failed": 0, "batches": 0}
+        self.started_at = time.monotonic()
+        self.verbosity = options["verbosity"]
+
+        seen = set()
+        pending = set()
+        next_start = 0.0
+
+        with ThreadPoolExecutor(max_workers=concurrency, thread_name_prefix="cdn-warm") as executor:
+            for model in get_association_models(options["models"]):
+                self.stdout.write(f"Warming {model._meta.label}")
+
+                batch = []
+                for uuid in iter_model_uuids(model, options["chunk_size"]):
+                    if uuid in seen:
+                        continue
+                    seen.add(uuid)
+                    batch.append(uuid)
+                    if len(batch) < batch_size:
+                        continue
+
+                    pending, next_start = self._submit(executor, client, batch, hard_ttl, pending, concurrency,
+                                                       interval, next_start)
+                    batch = []
+
+                if batch:
+                    pending, next_start = self._submit(executor, client, batch, hard_ttl, pending, concurrency,
+                                                       interval, next_start)
+
+            for future in pending:
+                self._collect(future)
+
+        self._report(final=True)
+
+    def _submit(self, executor, client, batch: list[str], hard_ttl, pending: set, concurrency: int,
+                interval: float, next_start: float):
+        # Bounded concurrency: wait for a slot before starting the next batch
+        while len(pending) >= concurrency:
+            done, pending = wait(pending, return_when=FIRST_COMPLETED)
+            for future in done:
+                self._collect(future)
+
+        if interval:
+            delay = next_start - time.monotonic()
+            if delay > 0:
+                time.sleep(delay)
+            next_start = time.monotonic() + interval
+
+        future = executor.submit(client.get_files_metadata, batch, hard_ttl=hard_ttl)
+        future.batch = batch
+        pending.add(future)
+        return pending, next_start
+
+    def _collect(self, future) -> None:
+        batch = future.batch
+        self.stats["batches"] += 1
+        self.stats["files"] += len(batch)
+        try:
+            resolved = future.result()
+        except Exception as err:
+            self.stats["failed"] += len(batch)
+            self.stderr.write(f"Batch of {len(batch)} files unsuccessful, err: {format_error(err)}")
+        else:
+            self.stats["resolved"] += len(resolved)
+            self.stats["not_found"] += len(batch) - len(resolved)
+
+        if self.verbosity >= 2 or self.stats["batches"] % 10 == 0:
+            self._report()
+
+    def _report(self, final: bool = False) -> None:
+        elapsed = time.monotonic() - self.started_at
+        rate = self.stats["files"] / elapsed if elapsed else 0
+        line = (f"{self.stats['files']} files in {self.stats['batches']} batches, "
+                f"{self.stats['resolved']} cached, {self.stats['not_found']} not found, "
+                f"{self.stats['failed']} failed, {elapsed:.1f}s ({rate:.0f} files/s)")
+        if final:
+            self.stdout.write(self.style.SUCCESS(f"Done: {line}"))
+        else:
+            self.stdout.write(line)
@@ -0,0 +1,179 @@
+from django.contrib.contenttypes.models import ContentType
+from django.db import models, transaction
+
+from .client import CDNClient
+from .tasks import ASSIGN, UNASSIGN, defer_operations
+from .utils import FileMaxedOutError
+
+
+def _chunks(items: list, size: int):
+    for start in range(0, len(items), size):
+        yield items[start:start + size]
+
+
+class FileAssociationQuerySet(models.QuerySet):
+    """Attach and detach files on many objects with one batched CDN call and one bulk_update per chunk.
+
+    Every method takes a mapping of primary key -> file uuid(s), limited to the objects in this
+    queryset, and returns one result dict per CDN operation.
+    """
+
+    def _apply_operations(self, operations: list[dict]) -> list[dict]:
+        if not operations:
+            return []
+
+        if self.model._defer_cdn_changes:
+            defer_operations(operations, using=self.db)
+            return [{**operation, "is_done": True, "message": "deferred"} for operation in operations]
+
+        client = CDNClient()
+        results = []
+        for action, batch_call in ((UNASSIGN, client.batch_unassign), (ASSIGN, client.batch_assign)):
+            batch = [operation for operation in operations if operation["action"] == action]
+            items = [{key: value for key, value in operation.items() if key != "action"} for operation in batch]
+            for operation, result in zip(batch, batch_call(items)):
+                results.append({**operation, "is_done": result["is_done"], "message": result["message"]})
+        return results
+
+    def _content_type_id(self) -> int:
+        return ContentType.objects.get_for_model(self.model).id
+
+    def bulk_set_files(self, files: dict, batch_size: int = 1000) -> list[dict]:
+        """Set (or clear, with None) the file of single-file objects."""
+        content_type_id = self._content_type_id()
+        results = []
+
+        for chunk in _chunks(list(files.items()), batch_size):
+            objects = self.in_bulk([pk for pk, _ in chunk])
+            operations = []
+            for pk, file in chunk:
+                obj = objects.get(pk)
+                if obj is None:
+                    results.append({"action": ASSIGN, "uuid": str(file), "object_id": pk, "is_done": False,
+                                    "message": "Object not found"})
+                    continue
+                if str(obj.file or "") == str(file or ""):
+                    continue
+                if obj.file:
+                    operations.append({"action": UNASSIGN, "uuid": str(obj.file), "content_type_id": content_type_id,
+                                       "object_id": pk})
+                if file:
+                    operations.append({"action": ASSIGN, "uuid": str(file), "content_type_id": content_type_id,
+                                       "object_id": pk})
+
+            operation_results = self._apply_operations(operations)
+            results.extend(operation_results)
+
+            # Store what the CDN actually did: new file if assigned, none if only the old one was unassigned
+            changed = {}
+            for result in operation_results:
+                if not result["is_done"]:
+                    continue
+                obj = objects[result["object_id"]]
+                if result["action"] == ASSIGN:
+                    obj.file = result["uuid"]
+                elif str(obj.file) == result["uuid"]:
+                    obj.file = None
+                obj._original_file = obj.file
+                changed[obj.pk] = obj
+
+            with transaction.atomic(using=self.db):
+                self.bulk_update(list(changed.values()), ["file"])
+
+        return results
+
+    def bulk_add_files(self, files: dict, batch_size: int = 1000) -> list[dict]:
+        """Append files to multiple-file objects, respecting each model's `_max_allowed_files`."""
+        content_type_id = self._content_type_id()
+        results = []
+
+        for chunk in _chunks(list(files.items()), batch_size):
+            objects = self.in_bulk([pk for pk, _ in chunk])
+            operations = []
+            for pk, uuids in chunk:
+                obj = objects.get(pk)
+                if obj is None:
+                    results.extend({"action": ASSIGN, "uuid": str(file), "object_id": pk, "is_done": False,
+                                    "message": "Object not found"} for file in uuids)
+                    continue
+
+                existing = set(obj.files)
+                file_count = len(obj.files)
+                next_local_id = obj._get_next_local_id()
+                for file in dict.fromkeys(str(file) for file in uuids):
+                    if file in existing:
+                        continue
+                    if not file_count < obj._max_allowed_files:
+                        results.append({"action": ASSIGN, "uuid": file, "object_id": pk, "is_done": False,
+                                        "message": str(FileMaxedOutError(obj._max_allowed_files))})
+                        continue
+                    operations.append({"action": ASSIGN, "uuid": file, "content_type_id": content_type_id,
+                                       "object_id": pk, "local_id": next_local_id})
+                    file_count += 1
+                    next_local_id += 1
+
+            operation_results = self._apply_operations(operations)
+            results.extend(operation_results)
+
+            changed = {}
+            for result in operation_results:
+                if not result["is_done"]:
+                    continue
+                obj = objects[result["object_id"]]
+                obj.files.append(result["uuid"])
+                obj._assign_local_id(result["uuid"], result["local_id"])
+                obj._original_files = list(obj.files)
+                changed[obj.pk] = obj
+
+            with transaction.atomic(using=self.db):
+                self.bulk_update(list(changed.values()), ["files", "files_local_ids", "last_assigned_id"])
+
+        return results
+
+    def bulk_remove_files(self, files: dict, batch_size: int = 1000) -> list[dict]:
+        """Remove files from multiple-file objects."""
+        content_type_id = self._content_type_id()
+        results = []
+
+        for chunk in _chunks(list(files.items()), batch_size):
+            objects = self.in_bulk([pk for pk, _ in chunk])
+            operations = []
+            for pk, uuids in chunk:
+                obj = objects.get(pk)
+                if obj is None:
+                    results.extend({"action": UNASSIGN, "uuid": str(file), "object_id": pk, "is_done": False,
+                                    "message": "Object not found"} for file in uuids)
+                    continue
+
+                existing = set(obj.files)
+                for file in dict.fromkeys(str(file) for file in uuids):
+                    if file not in existing:
+                        results.append({"action": UNASSIGN, "uuid": file, "object_id": pk, "is_done": False,
+                                        "message": "File Not Found!"})
+                        continue
+                    operations.append({"action": UNASSIGN, "uuid": file, "content_type_id": content_type_id,
+                                       "object_id": pk, "local_id": obj._get_local_id_by_cdnfileid(file)})
+
+            operation_results = self._apply_operations(operations)
+            results.extend(operation_results)
+
+            removed = {}
+            for result in operation_results:
+                if result["is_done"]:
+                    removed.setdefault(result["object_id"], []).append(result)
+
+            for pk, object_results in removed.items():
+                obj = objects[pk]
+                removed_files = {result["uuid"] for result in object_results}
+                obj.files = [file for file in obj.files if str(file) not in removed_files]
+                for result in object_results:
+                    obj._delete_local_id(result["local_id"])
+                obj._original_files = list(obj.files)
+
+            with transaction.atomic(using=self.db):
+                self.bulk_update([objects[pk] for pk in removed], ["files", "files_local_ids"])
+
+        return results
+
+
+FileAssociationManager = models.Manager.from_queryset(FileAssociationQuerySet)
@@ -2,16 +2,19 @@ from pathlib import Path
 from django.contrib.contenttypes.models import ContentType
 from django.core.exceptions import ValidationError
 from django.db import models
-from django.conf import settings
 import uuid
 from .utils import InfiniteInt, FileMaxedOutError
 from .client import CDNClient
-
-SERVICE_NAME = getattr(settings, "SERVICE_NAME")
-SUB_SERVICE_NAME = getattr(settings, "SUB_SERVICE_NAME")
+from .managers import FileAssociationManager
+from .tasks import ASSIGN, UNASSIGN, defer_operations
 
 
 class FileAssociationMixin(models.Model):
+    # Queue assign / unassign calls until the transaction commits instead of making them inside save()
+    _defer_cdn_changes: bool = False
+
+    objects = FileAssociationManager()
+
     class Meta:
         abstract = True
 
@@ -19,6 +22,9 @@ class FileAssociationMixin(models.Model):
     def client(self):
         return CDNClient()
 
+    def _defer_cdn_operations(self, operations: list[dict]) -> None:
+        defer_operations(operations, using=self._state.db)
+
     def _check_file_status(self, file_id: str):
         result = self.client.check_file_status(uuid=file_id)
         if not result["is_available"]:
@@ -49,6 +55,18 @@ class SingleFileAssociationMixin(FileAssociationMixin):
 
         content_type = ContentType.objects.get_for_model(self)
 
+        if self._defer_cdn_changes:
+            operations = []
+            if old_file:
+                operations.append({"action": UNASSIGN, "uuid": str(old_file), "content_type_id": content_type.id,
+                                   "object_id": self.id})
+            if new_file:
+                operations.append({"action": ASSIGN, "uuid": str(new_file), "content_type_id": content_type.id,
+                                   "object_id": self.id})
+            self._defer_cdn_operations(operations)
+            self._original_file = self.file
+            return
+
         try:
 
             if old_file:
@@ -72,6 +90,12 @@ class SingleFileAssociationMixin(FileAssociationMixin):
             print(f"file update unsuccessful, err: {err}")
 
     def save(self, *args, **kwargs):
+        update_fields = kwargs.get("update_fields")
+        if update_fields is not None and "file" not in update_fields:
+            # Partial saves of other fields never touch the CDN
+            super().save(*args, **kwargs)
+            return
+
         if self.has_file_changed():
             self.handle_single_file_change(self._original_file, self.file)
         if not self.pk:
@@ -92,6 +116,12 @@ class SingleFileAssociationMixin(FileAssociationMixin):
     def get_file_metadata(self):
         return self.client.get_file_metadata(str(self.file))
 
+    def iter_file_content(self, offset: int = 0, length: int = 0):
+        return self.client.iter_file_content(str(self.file), offset=offset, length=length)
+
+    def read_range(self, start: int, length: int) -> bytes:
+        return self.client.read_range(str(self.file), start, length)
+
     def get_file(self, output_path: Path = None) -> str:
         file_name = self.get_file_metadata().get("file_name")
         if output_path:
@@ -108,6 +138,10 @@ class MultipleFileAssociationMixin(FileAssociationMixin):
     _original_files = None
     _max_allowed_files: int | InfiniteInt = InfiniteInt()
 
+    # uuid -> local id, the reverse of files_local_ids
+    _local_id_index: dict[str, int] | None = None
+    _local_id_index_source: dict | None = None
+
     class Meta:
         abstract = True
 
@@ -118,11 +152,15 @@ class MultipleFileAssociationMixin(FileAssociationMixin):
     def _get_last_assigned_local_id(self) -> int:
         return self.last_assigned_id if self.last_assigned_id else 0
 
+    def _get_local_id_index(self) -> dict[str, int]:
+        # Rebuilt whenever files_local_ids is replaced, e.g. by assignment or refresh_from_db
+        if self._local_id_index is None or self._local_id_index_source is not self.files_local_ids:
+            self._local_id_index = {str(value): int(key) for key, value in self.files_local_ids.items()}
+            self._local_id_index_source = self.files_local_ids
+        return self._local_id_index
+
     def _get_local_id_by_cdnfileid(self, cdn_file_id: uuid.UUID) -> int | None:
-        for key, value in self.files_local_ids.items():
-            if value == cdn_file_id:
-                return int(key)
-        return None
+        return self._get_local_id_index().get(str(cdn_file_id))
 
     def _get_cdnfileid_by_local_id(self, local_id: int) -> uuid.UUID | None:
         return self.files_local_ids.get(str(local_id), None)
@@ -131,12 +169,15 @@ class MultipleFileAssociationMixin(FileAssociationMixin):
         return self._get_last_assigned_local_id() + 1
 
     def _assign_local_id(self, cdn_file_id: uuid.uuid4, new_local_id: int) -> None:
-
+        index = self._get_local_id_index()
         self.files_local_ids[str(new_local_id)] = cdn_file_id
+        index[str(cdn_file_id)] = new_local_id
         self.last_assigned_id = new_local_id
 
     def _delete_local_id(self, local_id: int) -> None:
-        del self.files_local_ids[str(local_id)]
+        index = self._get_local_id_index()
+        cdn_file_id = self.files_local_ids.pop(str(local_id))
+        index.pop(str(cdn_file_id), None)
 
     def has_files_changed(self):
         """Compare the original files with the current files."""
@@ -154,34 +195,56 @@ class MultipleFileAssociationMixin(FileAssociationMixin):
         old_set = set(old_files or [])
         new_set = set(new_files or [])
 
-        removed = old_set - new_set
-        added = new_set - old_set
+        removed = [file for file in dict.fromkeys(old_files or []) if file not in new_set]
+        added = [file for file in dict.fromkeys(new_files or []) if file not in old_set]
 
         # Print out what was added and removed
         print(f"Files removed: {removed}")
         print(f"Files added: {added}")
+        self._file_errors = {}
 
         try:
-            for file in removed:
-                print(f"Deleting removed file {file} from CDN")
-                self._check_file_status(file_id=str(file))
-                old_local_id = self._get_local_id_by_cdnfileid(file)
-                self.client.unassign_from_instance(
-                    uuid=str(file),
-                    content_type_id=content_type.id,
-                    object_id=self.id,
-                    local_id=old_local_id)
-                self._delete_local_id(old_local_id)
-
-            for file in added:
-                print(f"Fetching added file {file} from CDN")
-                self._check_file_status(file_id=str(file))
-                new_local_id = self._get_next_local_id()
-                self.client.assign_to_instance(uuid=str(file),
-                                               content_type_id=content_type.id,
-                                               object_id=self.id,
-                                               local_id=new_local_id)
-                self._assign_local_id(file, new_local_id)
+            unassign_items = [{"uuid": str(file),
+                               "content_type_id": content_type.id,
+                               "object_id": self.id,
+                               "local_id": self._get_local_id_by_cdnfileid(file)} for file in removed]
+            next_local_id = self._get_next_local_id()
+            assign_items = [{"uuid": str(file),
+                             "content_type_id": content_type.id,
+                             "object_id": self.id,
+                             "local_id": next_local_id + index} for index, file in enumerate(added)]
+
+            if self._defer_cdn_changes:
+                for item in unassign_items:
+                    self._delete_local_id(item["local_id"])
+                for file, item in zip(added, assign_items):
+                    self._assign_local_id(file, item["local_id"])
+                self._defer_cdn_operations([{"action": UNASSIGN, **item} for item in unassign_items] +
+                                           [{"action": ASSIGN, **item} for item in assign_items])
+                self._original_files = list(self.files) if self.files else []
+                return
+
+            failed_removed = []
+            for file, item, result in zip(removed, unassign_items, self.client.batch_unassign(unassign_items)):
+                if result["is_done"]:
+                    self._delete_local_id(item["local_id"])
+                else:
+                    print(f"Deleting removed file {file} from CDN unsuccessful, err: {result['message']}")
+                    failed_removed.append(file)
+
+            failed_added = []
+            for file, item, result in zip(added, assign_items, self.client.batch_assign(assign_items)):
+                if result["is_done"]:
+                    self._assign_local_id(file, item["local_id"])
+                else:
+                    print(f"Fetching added file {file} from CDN unsuccessful, err: {result['message']}")
+                    failed_added.append(file)
+                    self._file_errors[file] = result["message"]
+
+            # Map partial failures back onto the files list
+            if failed_removed or failed_added:
+                failed_added = set(failed_added)
+                self.files = [file for file in self.files if file not in failed_added] + failed_removed
 
             self._original_files = list(self.files) if self.files else []
 
@@ -191,11 +254,26 @@ class MultipleFileAssociationMixin(FileAssociationMixin):
 
     def validate_unique(self, exclude=None):
         super().validate_unique(exclude)
-        if len(self.files) != len(set(self.files)):
-            self.files = list(set(self.files))
+        unique_files = list(dict.fromkeys(self.files))
+        if len(self.files) != len(unique_files):
+            self.files = unique_files
             raise ValidationError("Files must be unique. Duplicate files found.")
 
     def save(self, *args, **kwargs):
+        file_fields = {"files", "files_local_ids", "last_assigned_id"}
+        update_fields = kwargs.get("update_fields")
+        if update_fields is not None:
+            if file_fields.isdisjoint(update_fields):
+                # Partial saves of other fields never touch the CDN
+                super().save(*args, **kwargs)
+                return
+            # The file change handling also rewrites the local id columns
+            kwargs["update_fields"] = set(update_fields) | file_fields
+
+        if self.pk and not self.has_files_changed():
+            # Files untouched, skip validation, diffing and content type resolution
+            super().save(*args, **kwargs)
+            return
 
         self.full_clean()
         if self.has_files_changed():
@@ -213,12 +291,69 @@ class MultipleFileAssociationMixin(FileAssociationMixin):
         self.files.append(cdn_file_uuid)
         self.save()
 
+    def add_files(self, cdn_file_uuids: list) -> list[dict]:
+        """Add several files with a single save, returning a result per uuid.
+
+        Availability is checked by the batch assign call the save makes, per file.
+        """
+        uuids = list(dict.fromkeys(str(file) for file in cdn_file_uuids))
+        existing = {str(file) for file in self.files}
+
+        results = {}
+        added = []
+        for file in uuids:
+            if file in existing:
+                message = "File already added"
+            elif not len(self.files) + len(added) < self._max_allowed_files:
+                message = str(FileMaxedOutError(self._max_allowed_files))
+            else:
+                added.append(file)
+                continue
+            results[file] = {"uuid": file, "local_id": None, "is_done": False, "message": message}
+
+        if added:
+            self.files.extend(added)
+            self.save()
+
+        remaining = set(self.files)
+        file_errors = getattr(self, "_file_errors", {})
+        for file in added:
+            is_done = file in remaining
+            message = "added" if is_done else file_errors.get(file, "file update unsuccessful")
+            results[file] = {"uuid": file, "local_id": self._get_local_id_by_cdnfileid(file) if is_done else None,
+                             "is_done": is_done, "message": message}
+        return [results[file] for file in uuids]
+
     def remove_file(self, local_file_id: int):
         cdn_file_uuid = self._get_cdnfileid_by_local_id(local_file_id)
         self._remove_file(cdn_file_uuid)
 
+    def remove_files(self, local_file_ids: list[int]) -> list[dict]:
+        """Remove several files with a single save, returning a result per local id."""
+        local_ids = list(dict.fromkeys(int(local_id) for local_id in local_file_ids))
+        results = {}
+        removed = {}
+        for local_id in local_ids:
+            cdn_file_uuid = self._get_cdnfileid_by_local_id(local_id)
+            if cdn_file_uuid is None or cdn_file_uuid not in self.files:
+                results[local_id] = {"local_id": local_id, "uuid": None, "is_done": False,
+                                     "message": "File Not Found!"}
+            else:
+                removed[cdn_file_uuid] = local_id
+
+        if removed:
+            self.files = [file for file in self.files if file not in removed]
+            self.save()
+
+        remaining = set(self.files)
+        for cdn_file_uuid, local_id in removed.items():
+            is_done = cdn_file_uuid not in remaining
+            results[local_id] = {"local_id": local_id, "uuid": str(cdn_file_uuid), "is_done": is_done,
+                                 "message": "removed" if is_done else "file update unsuccessful"}
+        return [results[local_id] for local_id in local_ids]
+
     def _remove_file(self, cdn_file_uuid: uuid.UUID):
-        self.files.pop(self.files.index(cdn_file_uuid))
+        self.files.remove(cdn_file_uuid)
         self.save()
 
     def get_file_metadata(self, cdn_file_id: uuid.UUID = None, local_file_id: int = None):
@@ -226,6 +361,17 @@ class MultipleFileAssociationMixin(FileAssociationMixin):
             cdn_file_id = self._get_cdnfileid_by_local_id(local_file_id)
         return self.client.get_file_metadata(str(cdn_file_id))
 
+    def iter_file_content(self, cdn_file_id: uuid.UUID = None, local_file_id: int = None, offset: int = 0,
+                          length: int = 0):
+        if local_file_id and not cdn_file_id:
+            cdn_file_id = self._get_cdnfileid_by_local_id(local_file_id)
+        return self.client.iter_file_content(str(cdn_file_id), offset=offset, length=length)
+
+    def read_range(self, start: int, length: int, cdn_file_id: uuid.UUID = None, local_file_id: int = None) -> bytes:
+        if local_file_id and not cdn_file_id:
+            cdn_file_id = self._get_cdnfileid_by_local_id(local_file_id)
+        return self.client.read_range(str(cdn_file_id), start, length)
+
     def get_file(self, cdn_file_id: uuid.UUID = None, local_file_id: int = None, output_path: Path = None) -> str:
         file_name = self.get_file_metadata(cdn_file_id=cdn_file_id, local_file_id=local_file_id).get("file_name")
         if not cdn_file_id:
@@ -234,3 +380,15 @@ class MultipleFileAssociationMixin(FileAssociationMixin):
             output_path = output_path / self.name
         result = self.client.download_file(str(cdn_file_id), output_file_path=output_path, file_name=file_name)
         return result
+
+    def get_files(self, output_path: Path, local_file_ids: list[int] = None, max_concurrency: int = 8,
+                  progress=None) -> dict[str, dict]:
+        """Download several (by default all) files in parallel, keyed by local id."""
+        if local_file_ids is None:
+            local_file_ids = list(self.files_local_ids)
+        uuids_by_local_id = {str(local_id): self._get_cdnfileid_by_local_id(local_id) for local_id in local_file_ids}
+
+        results = self.client.download_many([str(uuid) for uuid in uuids_by_local_id.values() if uuid],
+                                            output_path, max_concurrency=max_concurrency, progress=progress)
+        return {local_id: results.get(str(uuid), {"error": "File Not Found!"})
+                for local_id, uuid in uuids_by_local_id.items()}
@@ -65,11 +65,26 @@ class CDNServiceStub(object):
                 request_serializer=cdn__pb2.File.SerializeToString,
                 response_deserializer=cdn__pb2.FileUploadResponse.FromString,
                 _registered_method=True)
+        self.UploadFileStream = channel.stream_unary(
+                '/cdn.CDNService/UploadFileStream',
+                request_serializer=cdn__pb2.File.SerializeToString,
+                response_deserializer=cdn__pb2.FileUploadResponse.FromString,
+                _registered_method=True)
         self.FilterFile = channel.unary_unary(
                 '/cdn.CDNService/FilterFile',
                 request_serializer=cdn__pb2.FilterFileRequest.SerializeToString,
                 response_deserializer=cdn__pb2.FileMetadataListResponse.FromString,
                 _registered_method=True)
+        self.BatchAssign = channel.unary_unary(
+                '/cdn.CDNService/BatchAssign',
+                request_serializer=cdn__pb2.BatchAssignUnassignRequest.SerializeToString,
+                response_deserializer=cdn__pb2.BatchAssignUnassignResponse.FromString,
+                _registered_method=True)
+        self.BatchUnassign = channel.unary_unary(
+                '/cdn.CDNService/BatchUnassign',
+                request_serializer=cdn__pb2.BatchAssignUnassignRequest.SerializeToString,
+                response_deserializer=cdn__pb2.BatchAssignUnassignResponse.FromString,
+                _registered_method=True)
 
 
 class CDNServiceServicer(object):
@@ -116,12 +131,32 @@ class CDNServiceServicer(object):
         context.set_details('Method not implemented!')
         raise NotImplementedError('Method not implemented!')
 
+    def UploadFileStream(self, request_iterator, context):
+        """Upload a file in chunks, metadata fields are only read from the first message
+        """
+        context.set_code(grpc.StatusCode.UNIMPLEMENTED)
+        context.set_details('Method not implemented!')
+        raise NotImplementedError('Method not implemented!')
+
     def FilterFile(self, request, context):
         """Missing associated documentation comment in .proto file."""
         context.set_code(grpc.StatusCode.UNIMPLEMENTED)
         context.set_details('Method not implemented!')
         raise NotImplementedError('Method not implemented!')
 
+    def BatchAssign(self, request, context):
+        """Assign / unassign many files in one call, results are returned in request order
+        """
+        context.set_code(grpc.StatusCode.UNIMPLEMENTED)
+        context.set_details('Method not implemented!')
+        raise NotImplementedError('Method not implemented!')
+
+    def BatchUnassign(self, request, context):
+        """Missing associated documentation comment in .proto file."""
+        context.set_code(grpc.StatusCode.UNIMPLEMENTED)
+        context.set_details('Method not implemented!')
+        raise NotImplementedError('Method not implemented!')
+
 
 def add_CDNServiceServicer_to_server(servicer, server):
     rpc_method_handlers = {
@@ -155,11 +190,26 @@ def add_CDNServiceServicer_to_server(servicer, server):
                     request_deserializer=cdn__pb2.File.FromString,
                     response_serializer=cdn__pb2.FileUploadResponse.SerializeToString,
             ),
+            'UploadFileStream': grpc.stream_unary_rpc_method_handler(
+                    servicer.UploadFileStream,
+                    request_deserializer=cdn__pb2.File.FromString,
+                    response_serializer=cdn__pb2.FileUploadResponse.SerializeToString,
+            ),
             'FilterFile': grpc.unary_unary_rpc_method_handler(
                     servicer.FilterFile,
                     request_deserializer=cdn__pb2.FilterFileRequest.FromString,
                     response_serializer=cdn__pb2.FileMetadataListResponse.SerializeToString,
             ),
+            'BatchAssign': grpc.unary_unary_rpc_method_handler(
+                    servicer.BatchAssign,
+                    request_deserializer=cdn__pb2.BatchAssignUnassignRequest.FromString,
+                    response_serializer=cdn__pb2.BatchAssignUnassignResponse.SerializeToString,
+            ),
+            'BatchUnassign': grpc.unary_unary_rpc_method_handler(
+                    servicer.BatchUnassign,
+                    request_deserializer=cdn__pb2.BatchAssignUnassignRequest.FromString,
+                    response_serializer=cdn__pb2.BatchAssignUnassignResponse.SerializeToString,
+            ),
     }
     generic_handler = grpc.method_handlers_generic_handler(
             'cdn.CDNService', rpc_method_handlers)
@@ -334,6 +384,33 @@ class CDNService(object):
             metadata,
             _registered_method=True)
 
+    @staticmethod
+    def UploadFileStream(request_iterator,
+            target,
+            options=(),
+            channel_credentials=None,
+            call_credentials=None,
+            insecure=False,
+            compression=None,
+            wait_for_ready=None,
+            timeout=None,
+            metadata=None):
+        return grpc.experimental.stream_unary(
+            request_iterator,
+            target,
+            '/cdn.CDNService/UploadFileStream',
+            cdn__pb2.File.SerializeToString,
+            cdn__pb2.FileUploadResponse.FromString,
+            options,
+            channel_credentials,
+            insecure,
+            call_credentials,
+            compression,
+            wait_for_ready,
+            timeout,
+            metadata,
+            _registered_method=True)
+
     @staticmethod
     def FilterFile(request,
             target,
@@ -360,3 +437,57 @@ class CDNService(object):
             timeout,
             metadata,
             _registered_method=True)
+
+    @staticmethod
+    def BatchAssign(request,
+            target,
+            options=(),
+            channel_credentials=None,
+            call_credentials=None,
+            insecure=False,
+            compression=None,
+            wait_for_ready=None,
+            timeout=None,
+            metadata=None):
+        return grpc.experimental.unary_unary(
+            request,
+            target,
+            '/cdn.CDNService/BatchAssign',
+            cdn__pb2.BatchAssignUnassignRequest.SerializeToString,
+            cdn__pb2.BatchAssignUnassignResponse.FromString,
+            options,
+            channel_credentials,
+            insecure,
+            call_credentials,
+            compression,
+            wait_for_ready,
+            timeout,
+            metadata,
+            _registered_method=True)
+
+    @staticmethod
+    def BatchUnassign(request,
+            target,
+            options=(),
+            channel_credentials=None,
+            call_credentials=None,
+            insecure=False,
+            compression=None,
+            wait_for_ready=None,
+            timeout=None,
+            metadata=None):
+        return grpc.experimental.unary_unary(
+            request,
+            target,
+            '/cdn.CDNService/BatchUnassign',
+            cdn__pb2.BatchAssignUnassignRequest.SerializeToString,
+            cdn__pb2.BatchAssignUnassignResponse.FromString,
+            options,
+            channel_credentials,
+            insecure,
+            call_credentials,
+            compression,
+            wait_for_ready,
+            timeout,
+            metadata,
+            _registered_method=True)
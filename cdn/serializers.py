@@ -1,12 +1,63 @@
+from django.db import models
 from rest_framework import serializers
 
 from .client import CDNClient
 from .models import SingleFileAssociationMixin, MultipleFileAssociationMixin
 
-client = CDNClient()
+
+def prefetch_cdn_metadata(objects) -> dict[str, dict]:
+    """Resolve metadata for every file attached to `objects` in one batched lookup."""
+    uuids = []
+    for obj in objects:
+        if isinstance(obj, SingleFileAssociationMixin):
+            if obj.file:
+                uuids.append(str(obj.file))
+        elif isinstance(obj, MultipleFileAssociationMixin):
+            uuids.extend(str(uuid) for uuid in (obj.files_local_ids or {}).values())
+
+    if not uuids:
+        return {}
+
+    uuids = list(dict.fromkeys(uuids))
+    metadata_by_uuid = CDNClient().get_files_metadata(uuids)
+    # Keep unresolved uuids as None so the row getters don't look them up again
+    return {uuid: metadata_by_uuid.get(uuid) for uuid in uuids}
+
+
+class FileListSerializer(serializers.ListSerializer):
+    """List serializer that prefetches CDN metadata for the whole page before rendering rows."""
+
+    def to_representation(self, data):
+        iterable = data.all() if isinstance(data, models.manager.BaseManager) else data
+        objects = list(iterable)
+
+        try:
+            self.child._cdn_metadata = prefetch_cdn_metadata(objects)
+        except Exception as err:
+            print(err)
+            self.child._cdn_metadata = {}
+
+        return super().to_representation(objects)
 
 
 class FileSerializerMixin:
+    _cdn_metadata = None
+
+    @classmethod
+    def many_init(cls, *args, **kwargs):
+        # A list_serializer_class set on Meta wins, otherwise build a FileListSerializer the way DRF does
+        if hasattr(getattr(cls, 'Meta', None), 'list_serializer_class'):
+            return super().many_init(*args, **kwargs)
+
+        list_kwargs = {}
+        for key in ('allow_empty', 'max_length', 'min_length'):
+            value = kwargs.pop(key, None)
+            if value is not None:
+                list_kwargs[key] = value
+        list_kwargs['child'] = cls(*args, **kwargs)
+        list_kwargs.update({key: value for key, value in kwargs.items()
+                            if key in serializers.LIST_SERIALIZER_KWARGS})
+        return FileListSerializer(*args, **list_kwargs)
 
     def get_fields(self):
         fields = super().get_fields()
@@ -62,11 +113,18 @@ class FileSerializerMixin:
 
         raise AttributeError(f"{self.__class__.__name__} object has no attribute {name}")
 
+    def _get_prefetched_metadata(self, uuids: list[str]) -> dict[str, dict]:
+        prefetched = self._cdn_metadata or {}
+        return {uuid: prefetched[uuid] for uuid in uuids if uuid in prefetched}
+
     def _serialize_single_file(self, file_uuid):
         if not file_uuid:
             return None
+        prefetched = self._get_prefetched_metadata([str(file_uuid)])
+        if str(file_uuid) in prefetched:
+            return prefetched[str(file_uuid)]
         try:
-            return client.get_file_metadata(str(file_uuid))
+            return CDNClient().get_file_metadata(str(file_uuid))
         except Exception:
             return None
 
@@ -76,15 +134,21 @@ class FileSerializerMixin:
 
         if not file_id_uuid_dict:
             return {}
-        results = []  # TODO; change to => results = {}
-        for local_id, uuid in file_id_uuid_dict.items():
+        uuids = [str(uuid) for uuid in file_id_uuid_dict.values()]
+        metadata_by_uuid = self._get_prefetched_metadata(uuids)
+        missing = [uuid for uuid in uuids if uuid not in metadata_by_uuid]
+        if missing:
             try:
-                metadata = client.get_file_metadata(str(uuid))
-                if metadata:
-                    results.append({str(local_id): metadata})
-                    # TODO: change to => results.update({str(local_id): metadata})
+                metadata_by_uuid.update(CDNClient().get_files_metadata(missing))
             except Exception as err:
                 print(err)
+
+        results = []  # TODO; change to => results = {}
+        for local_id, uuid in file_id_uuid_dict.items():
+            metadata = metadata_by_uuid.get(str(uuid))
+            if metadata:
+                results.append({str(local_id): metadata})
+                # TODO: change to => results.update({str(local_id): metadata})
         return results
 
 
@@ -104,3 +168,29 @@ class AddFileSerializer(serializers.Serializer):
             return {"detail": f"File with UUID {uuid} added successfully."}
         except Exception as err:
             return {"error": str(err)}
+
+
+class AddFilesSerializer(serializers.Serializer):
+    uuids = serializers.ListField(child=serializers.UUIDField(), allow_empty=False)
+
+    def save(self, instance):
+        """
+        Add every file to the provided instance with a single save.
+        """
+        try:
+            return {"results": instance.add_files(cdn_file_uuids=[str(uuid) for uuid in self.validated_data['uuids']])}
+        except Exception as err:
+            return {"error": str(err)}
+
+
+class RemoveFilesSerializer(serializers.Serializer):
+    file_ids = serializers.ListField(child=serializers.IntegerField(min_value=1), allow_empty=False)
+
+    def save(self, instance):
+        """
+        Remove every file (by local id) from the provided instance with a single save.
+        """
+        try:
+            return {"results": instance.remove_files(local_file_ids=self.validated_data['file_ids'])}
+        except Exception as err:
+            return {"error": str(err)}
@@ -0,0 +1,164 @@
+import hashlib
+import mimetypes
+import uuid
+from concurrent import futures
+from threading import Lock
+
+import grpc
+
+from .proto import cdn_pb2, cdn_pb2_grpc
+
+
+class LocalCDNServicer(cdn_pb2_grpc.CDNServiceServicer):
+    """In-memory reference implementation of the CDN service, for running the client locally and in tests."""
+
+    def __init__(self, chunk_size: int = 64 * 1024):
+        self.chunk_size = chunk_size
+        self.files = {}
+        self.assignments = set()
+        self._lock = Lock()
+        self._failures = []
+
+    def add_file(self, content: bytes, file_name: str, service_name: str = "", sub_service_name: str = "",
+                 user_id: int = 0) -> str:
+        file_uuid = str(uuid.uuid4())
+        with self._lock:
+            self.files[file_uuid] = {
+                "content": content,
+                "file_name": file_name,
+                "service_name": service_name,
+                "sub_service_name": sub_service_name,
+                "user_id": user_id,
+                "version": "1",
+                "checksum": hashlib.sha256(content).hexdigest(),
+            }
+        return file_uuid
+
+    def inject_failure(self, after_bytes: int, times: int = 1, code: grpc.StatusCode = grpc.StatusCode.UNAVAILABLE):
+        """Make the next `times` GetFileContent streams abort with `code` after sending `after_bytes` bytes."""
+        with self._lock:
+            self._failures.extend([(after_bytes, code)] * times)
+
+    def _get_file(self, file_uuid: str, context) -> dict:
+        file = self.files.get(file_uuid)
+        if file is None:
+            context.abort(grpc.StatusCode.NOT_FOUND, f"File {file_uuid} not found")
+        return file
+
+    def _metadata(self, file_uuid: str, file: dict) -> cdn_pb2.FileMetadataResponse:
+        return cdn_pb2.FileMetadataResponse(
+            uuid=file_uuid,
+            file_name=file["file_name"],
+            file_size=len(file["content"]),
+            file_type=mimetypes.guess_type(file["file_name"])[0] or "application/octet-stream",
+            version=file["version"],
+            user_id=file["user_id"],
+            service_name=file["service_name"],
+            sub_service_name=file["sub_service_name"],
+            checksum=file["checksum"])
+
+    def GetFileMetadata(self, request, context):
+        return self._metadata(request.uuid, self._get_file(request.uuid, context))
+
+    def GetFileContent(self, request, context):
+        content = self._get_file(request.uuid, context)["content"]
+        if request.offset < 0 or request.length < 0 or request.offset > len(content):
+            context.abort(grpc.StatusCode.OUT_OF_RANGE, f"Invalid range {request.offset}+{request.length}")
+        end = min(request.offset + request.length, len(content)) if request.length else len(content)
+
+        with self._lock:
+            failure = self._failures.pop(0) if self._failures else None
+
+        sent = 0
+        for start in range(request.offset, end, self.chunk_size):
+            chunk = content[start:min(start + self.chunk_size, end)]
+            if failure is not None and sent + len(chunk) > failure[0]:
+                chunk = chunk[:failure[0] - sent]
+                if chunk:
+                    yield cdn_pb2.FileContentResponse(file_content=chunk)
+                context.abort(failure[1], "Injected failure")
+            sent += len(chunk)
+            yield cdn_pb2.FileContentResponse(file_content=chunk)
+
+    def GetFileStatus(self, request, context):
+        return cdn_pb2.FileStatusResponse(is_available=request.uuid in self.files)
+
+    def AssignToInstance(self, request, context):
+        self._get_file(request.uuid, context)
+        with self._lock:
+            self.assignments.add((request.uuid, request.content_type_id, request.object_id, request.local_id))
+        return cdn_pb2.AssignUnassignResponse(message="assigned", is_done=True)
+
+    def UnassignFromInstance(self, request, context):
+        self._get_file(request.uuid, context)
+        with self._lock:
+            self.assignments.discard((request.uuid, request.content_type_id, request.object_id, request.local_id))
+        return cdn_pb2.AssignUnassignResponse(message="unassigned", is_done=True)
+
+    def _batch(self, request, assign: bool):
+        results = []
+        for item in request.items:
+            result = cdn_pb2.AssignUnassignResult(uuid=item.uuid, local_id=item.local_id)
+            if item.uuid not in self.files:
+                result.message = "File Not Found!"
+            else:
+                key = (item.uuid, item.content_type_id, item.object_id, item.local_id)
+                with self._lock:
+                    if assign:
+                        self.assignments.add(key)
+                    else:
+                        self.assignments.discard(key)
+                result.is_done = True
+                result.message = "assigned" if assign else "unassigned"
+            results.append(result)
+        return cdn_pb2.BatchAssignUnassignResponse(results=results)
+
+    def BatchAssign(self, request, context):
+        return self._batch(request, assign=True)
+
+    def BatchUnassign(self, request, context):
+        return self._batch(request, assign=False)
+
+    def UploadFile(self, request, context):
+        file_uuid = self.add_file(request.file, request.file_name, request.service_name, request.sub_service_name,
+                                  request.user_id)
+        return cdn_pb2.FileUploadResponse(result="uploaded", uuid=file_uuid)
+
+    def UploadFileStream(self, request_iterator, context):
+        first = None
+        chunks = []
+        for request in request_iterator:
+            if first is None:
+                first = request
+            chunks.append(request.file)
+
+        if first is None:
+            context.abort(grpc.StatusCode.INVALID_ARGUMENT, "Empty upload stream")
+
+        file_uuid = self.add_file(b"".join(chunks), first.file_name, first.service_name, first.sub_service_name,
+                                  first.user_id)
+        return cdn_pb2.FileUploadResponse(result="uploaded", uuid=file_uuid)
+
+    def FilterFile(self, request, context):
+        results = []
+        for file_uuid, file in list(self.files.items()):
+            if request.uuid_list and file_uuid not in request.uuid_list:
+                continue
+            if request.HasField("service_name") and file["service_name"] != request.service_name:
+                continue
+            if request.HasField("sub_service_name") and file["sub_service_name"] != request.sub_service_name:
+                continue
+            if request.HasField("user_id") and file["user_id"] != request.user_id:
+                continue
+            results.append(self._metadata(file_uuid, file))
+        return cdn_pb2.FileMetadataListResponse(files=results)
+
+
+def create_server(address: str = "localhost:50051", servicer: LocalCDNServicer = None, max_workers: int = 10):
+    """Start an insecure gRPC server serving `servicer` (a fresh LocalCDNServicer by default)."""
+    servicer = servicer or LocalCDNServicer()
+    server = grpc.server(futures.ThreadPoolExecutor(max_workers=max_workers))
+    cdn_pb2_grpc.add_CDNServiceServicer_to_server(servicer, server)
+    server.add_insecure_port(address)
+    server.start()
+    return server, servicer
@@ -0,0 +1,223 @@
+import os
+import shutil
+import tempfile
+import time
+from contextlib import contextmanager
+from pathlib import Path
+
+from django.conf import settings
+
+try:
+    import fcntl
+except ImportError:  # not available on windows
+    fcntl = None
+
+
+class FileCache:
+    """Size-bounded on-disk store for downloaded files, shared by every worker on the host.
+
+    Files live at `<root>/<uuid>/<version>/<file_name>`, so the directory tree itself is the
+    index any process can look up. Entries are written to `<root>/.tmp` (or, for resumable
+    downloads, to `<file_name>.partial` next to the entry) and renamed into place, and their mtime
+    is bumped on every hit so eviction can drop the least recently used ones. A `<file_name>.lock`
+    next to the entry lets one process per host download it while the others wait. A file larger
+    than `max_bytes` is never stored, it is handed out from its own temporary directory instead.
+    Partial files count in `usage()` and are removed once untouched for `partial_max_age`.
+    """
+    partial_suffix = ".partial"
+    lock_suffix = ".lock"
+    _default_max_bytes = 1024 * 1024 * 1024  # 1 GiB default quota
+    _default_partial_max_age = 60 * 60 * 24  # abandoned partial downloads are dropped after a day
+
+    def __init__(self, root: str | Path, max_bytes: int = _default_max_bytes,
+                 partial_max_age: float = _default_partial_max_age):
+        self.root = Path(root)
+        self.max_bytes = max_bytes
+        self.partial_max_age = partial_max_age
+        self._tmp_dir = self.root / ".tmp"
+        self._tmp_dir.mkdir(parents=True, exist_ok=True)
+
+    @classmethod
+    def from_settings(cls) -> "FileCache":
+        root = getattr(settings, "CDN_FILE_CACHE_DIR", None) or Path(tempfile.gettempdir()) / "cdn_file_cache"
+        max_bytes = getattr(settings, "CDN_FILE_CACHE_MAX_BYTES", cls._default_max_bytes)
+        partial_max_age = getattr(settings, "CDN_FILE_CACHE_PARTIAL_MAX_AGE", cls._default_partial_max_age)
+        return cls(root, max_bytes, partial_max_age)
+
+    def path_for(self, uuid: str, version: str | None, file_name: str | None) -> Path:
+        return self.root / str(uuid) / (version or "0") / (Path(file_name or "").name or "file")
+
+    def partial_path_for(self, uuid: str, version: str | None, file_name: str | None) -> Path:
+        """Where an interrupted download of the entry is kept, so a later attempt can resume it."""
+        path = self.path_for(uuid, version, file_name)
+        return path.with_name(path.name + self.partial_suffix)
+
+    def lock_path_for(self, uuid: str, version: str | None, file_name: str | None) -> Path:
+        path = self.path_for(uuid, version, file_name)
+        return path.with_name(path.name + self.lock_suffix)
+
+    @contextmanager
+    def download_lock(self, uuid: str, version: str | None, file_name: str | None):
+        """Hold the host-wide lock for downloading an entry; other processes block here until it is released.
+
+        The kernel drops the lock if the holder dies, and the next process resumes its partial file.
+        """
+        if fcntl is None:
+            yield
+            return
+
+        path = self.lock_path_for(uuid, version, file_name)
+        while True:
+            try:
+                path.parent.mkdir(parents=True, exist_ok=True)
+                lock_file = open(path, "a")
+            except FileNotFoundError:
+                # The entry directory was evicted in between
+                continue
+            fcntl.flock(lock_file, fcntl.LOCK_EX)
+            try:
+                is_current = os.fstat(lock_file.fileno()).st_ino == os.stat(path).st_ino
+            except FileNotFoundError:
+                is_current = False
+            if is_current:
+                break
+            # The lock file was removed while we waited, lock the new one instead
+            lock_file.close()
+
+        try:
+            yield
+        finally:
+            fcntl.flock(lock_file, fcntl.LOCK_UN)
+            lock_file.close()
+
+    def _remove_lock(self, lock_path: Path) -> None:
+        # Only remove lock files nobody is holding or waiting to re-check
+        if fcntl is None:
+            lock_path.unlink(missing_ok=True)
+            return
+        try:
+            lock_file = open(lock_path, "a")
+        except FileNotFoundError:
+            return
+        with lock_file:
+            try:
+                fcntl.flock(lock_file, fcntl.LOCK_EX | fcntl.LOCK_NB)
+            except BlockingIOError:
+                return
+            lock_path.unlink(missing_ok=True)
+
+    def store(self, src: str | Path, uuid: str, version: str | None, file_name: str | None) -> str:
+        """Move a complete file into place and return the path to read it from."""
+        path = self.path_for(uuid, version, file_name)
+        if os.stat(src).st_size > self.max_bytes:
+            # It would evict everything else and still not fit, the caller owns this copy
+            outside_path = self.outside_path_for(file_name)
+            shutil.move(src, outside_path)
+            return str(outside_path)
+
+        path.parent.mkdir(parents=True, exist_ok=True)
+        os.replace(src, path)
+        self.evict(keep=path)
+        return str(path)
+
+    def outside_path_for(self, file_name: str | None) -> Path:
+        """A path in a new temporary directory outside the store, for a file larger than `max_bytes`.
+
+        Nothing evicts it, whoever it is handed to removes the file and its directory.
+        """
+        return Path(tempfile.mkdtemp(prefix="cdn-")) / (Path(file_name or "").name or "file")
+
+    def commit_partial(self, uuid: str, version: str | None, file_name: str | None) -> str:
+        """Move a completed partial download into place."""
+        return self.store(self.partial_path_for(uuid, version, file_name), uuid, version, file_name)
+
+    def get(self, uuid: str, version: str | None, file_name: str | None) -> str | None:
+        """Return the cached path for a file version, or None."""
+        path = self.path_for(uuid, version, file_name)
+        try:
+            os.utime(path)
+        except FileNotFoundError:
+            return None
+        return str(path)
+
+    def temp_path(self) -> Path:
+        """A new empty file on the store's filesystem to download into before calling `store`."""
+        fd, tmp_path = tempfile.mkstemp(dir=self._tmp_dir)
+        os.close(fd)
+        return Path(tmp_path)
+
+    def _entries(self) -> list[tuple[float, int, Path]]:
+        entries = []
+        for path in self.root.glob("*/*/*"):
+            # Partial downloads are included, they take space too
+            if path.parts[-3] == ".tmp" or path.name.endswith(self.lock_suffix):
+                continue
+            try:
+                stat = path.stat()
+            except FileNotFoundError:
+                continue
+            entries.append((stat.st_mtime, stat.st_size, path))
+        return entries
+
+    def usage(self) -> int:
+        """Total bytes currently stored."""
+        return sum(size for _, size, _ in self._entries())
+
+    @contextmanager
+    def _lock(self):
+        if fcntl is None:
+            yield
+            return
+        with open(self.root / ".lock", "a") as lock_file:
+            fcntl.flock(lock_file, fcntl.LOCK_EX)
+            try:
+                yield
+            finally:
+                fcntl.flock(lock_file, fcntl.LOCK_UN)
+
+    def _remove(self, path: Path) -> None:
+        path.unlink(missing_ok=True)
+        if not path.name.endswith(self.partial_suffix):
+            self._remove_lock(path.with_name(path.name + self.lock_suffix))
+        for parent in (path.parent, path.parent.parent):
+            try:
+                parent.rmdir()
+            except OSError:
+                break
+
+    def evict(self, keep: Path = None) -> None:
+        """Drop abandoned partial downloads, then remove least recently used files until the
+        completed ones fit in `max_bytes`, never `keep`.
+
+        Downloads in progress can't be evicted, so they are left out of the target instead of
+        making every other entry go.
+        """
+        with self._lock():
+            expired_before = time.time() - self.partial_max_age
+            entries = []
+            for mtime, size, path in self._entries():
+                if not path.name.endswith(self.partial_suffix):
+                    entries.append((mtime, size, path))
+                elif mtime < expired_before:
+                    self._remove(path)
+
+            total = sum(size for _, size, _ in entries)
+            if total <= self.max_bytes:
+                return
+
+            for _, size, path in sorted(entries):
+                if path == keep:
+                    continue
+                self._remove(path)
+                total -= size
+                if total <= self.max_bytes:
+                    break
+
+    def delete(self, uuid: str) -> None:
+        """Remove every cached version of a file."""
+        with self._lock():
+            for path in (self.root / str(uuid)).glob("*/*"):
+                if path.name.endswith(self.lock_suffix):
+                    self._remove_lock(path)
+                else:
+                    path.unlink(missing_ok=True)
@@ -0,0 +1,138 @@
+import os
+from concurrent.futures import ThreadPoolExecutor
+from threading import Lock
+
+from django.conf import settings
+from django.db import transaction
+from django.utils.module_loading import import_string
+
+from .client import CDNClient
+
+ASSIGN = "assign"
+UNASSIGN = "unassign"
+
+_executor = None
+_executor_lock = Lock()
+
+
+def _operation_key(operation: dict) -> tuple:
+    return operation["uuid"], operation["content_type_id"], operation["object_id"], operation.get("local_id")
+
+
+def coalesce_operations(operations: list[dict]) -> list[dict]:
+    """Drop duplicate operations and cancel out an assign and unassign of the same file on the same instance."""
+    pending = {}
+    for operation in operations:
+        key = _operation_key(operation)
+        previous = pending.get(key)
+        if previous is not None and previous["action"] != operation["action"]:
+            del pending[key]
+        else:
+            pending[key] = operation
+    return list(pending.values())
+
+
+def apply_operations(operations: list[dict]) -> list[dict]:
+    """Run queued assign / unassign operations with one batch call per action.
+
+    Operations are plain dicts (action, uuid, content_type_id, object_id, local_id), so external
+    task queues can serialize them and call this from a worker.
+    """
+    operations = coalesce_operations(operations)
+    client = CDNClient()
+
+    results = []
+    for action, batch_call in ((UNASSIGN, client.batch_unassign), (ASSIGN, client.batch_assign)):
+        items = [{key: value for key, value in operation.items() if key != "action"}
+                 for operation in operations if operation["action"] == action]
+        for result in batch_call(items):
+            if not result["is_done"]:
+                print(f"Deferred {action} of file {result['uuid']} unsuccessful, err: {result['message']}")
+            results.append(result)
+    return results
+
+
+class ThreadPoolCDNExecutor:
+    """Default executor, runs queued operations on a background thread in this process.
+
+    Batches must reach the CDN in commit order, or an unassign committed after an assign of the
+    same file could run first, so there is a single worker. Point CDN_TASK_EXECUTOR at any class
+    with a `submit(operations)` method to hand them to an external task queue instead, e.g. one
+    that calls `apply_operations` from a celery task; it has to keep that order as well.
+    """
+
+    def __init__(self, max_workers: int = 1):
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="cdn-tasks")
+
+    def submit(self, operations: list[dict]) -> None:
+        self._executor.submit(apply_operations, operations)
+
+
+def get_executor():
+    global _executor
+    with _executor_lock:
+        if _executor is None:
+            executor_path = getattr(settings, "CDN_TASK_EXECUTOR", "cdn.tasks.ThreadPoolCDNExecutor")
+            _executor = import_string(executor_path)()
+        return _executor
+
+
+def _after_fork_in_child() -> None:
+    """Forget the parent's executor, its worker threads don't exist in the child."""
+    global _executor, _executor_lock
+    _executor_lock = Lock()
+    _executor = None
+
+
+if hasattr(os, "register_at_fork"):
+    os.register_at_fork(after_in_child=_after_fork_in_child)
+
+
+class _PendingFlush:
+    """on_commit callback submitting every operation deferred in one transaction as one batch."""
+
+    def __init__(self):
+        self.operations = []
+
+    def __call__(self):
+        operations = coalesce_operations(self.operations)
+        if operations:
+            get_executor().submit(operations)
+
+
+class _DeferredOperations:
+    """on_commit callback handing the operations of one call to the transaction's flush.
+
+    It is registered under the savepoints open at the time, so rolling one back drops them.
+    """
+
+    def __init__(self, flush: _PendingFlush, operations: list[dict]):
+        self.flush = flush
+        self.operations = operations
+
+    def __call__(self):
+        self.flush.operations.extend(self.operations)
+
+
+def defer_operations(operations: list[dict], using: str = None) -> None:
+    """Queue operations to run after the current transaction commits, or right away outside of one."""
+    if not operations:
+        return
+
+    connection = transaction.get_connection(using)
+    if not connection.in_atomic_block:
+        get_executor().submit(coalesce_operations(operations))
+        return
+
+    # run_on_commit holds (savepoint ids, callback[, robust]) entries; tests/test_tasks.py pins the
+    # savepoint and rollback behaviour this relies on
+    flush = next((entry[1] for entry in connection.run_on_commit if isinstance(entry[1], _PendingFlush)), None)
+    if flush is None:
+        flush = _PendingFlush()
+    else:
+        connection.run_on_commit = [entry for entry in connection.run_on_commit if entry[1] is not flush]
+
+    transaction.on_commit(_DeferredOperations(flush, list(operations)), using=using)
+    # The flush runs after every surviving hook and is only dropped when the whole transaction rolls back
+    transaction.on_commit(flush, using=using)
+    connection.run_on_commit[-1][0].clear()
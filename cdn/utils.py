@@ -1,3 +1,8 @@
+import mmap
+from pathlib import Path
+from typing import Iterator
+
+
 class InfiniteInt:
     def __gt__(self, other):
         return True
@@ -23,3 +28,37 @@ class FileMaxedOutError(Exception):
 
     def __str__(self):
         return f"file lenght maxed out reached, allowd file count: {self.max_file_count}"
+
+
+def iter_file_chunks(file, chunk_size: int) -> Iterator[bytes]:
+    """Read a path, a django File/UploadedFile or any binary file-like object in chunks."""
+    if isinstance(file, (str, Path)):
+        with open(file, 'rb') as f:
+            yield from iter_file_chunks(f, chunk_size)
+        return
+
+    if hasattr(file, 'chunks'):
+        yield from file.chunks(chunk_size)
+        return
+
+    while chunk := file.read(chunk_size):
+        yield chunk
+
+
+def iter_mmap_chunks(mapping: mmap.mmap, chunk_size: int) -> Iterator[bytes]:
+    """Slice a read-only mapping in chunks, releasing the pages of each chunk once it was consumed.
+
+    Slicing copies the chunk (protobuf bytes fields don't take buffers), but the mapped pages are
+    dropped right after, so resident memory stays around one chunk however large the file is.
+    """
+    # madvise offsets must be page aligned
+    chunk_size = max(chunk_size // mmap.PAGESIZE, 1) * mmap.PAGESIZE
+    release = getattr(mmap, "MADV_DONTNEED", None) if hasattr(mapping, "madvise") else None
+    if hasattr(mapping, "madvise") and hasattr(mmap, "MADV_SEQUENTIAL"):
+        mapping.madvise(mmap.MADV_SEQUENTIAL)
+
+    size = len(mapping)
+    for start in range(0, size, chunk_size):
+        yield mapping[start:start + chunk_size]
+        if release is not None:
+            mapping.madvise(release, start, min(chunk_size, size - start))
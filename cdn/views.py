@@ -1,7 +1,38 @@
+from itertools import chain
+
+import grpc
+from django.http import StreamingHttpResponse
+from django.utils.http import content_disposition_header
 from rest_framework import status
 from rest_framework.response import Response
 from rest_framework.decorators import action
-from .serializers import AddFileSerializer
+from .client import format_error
+from .serializers import AddFileSerializer, AddFilesSerializer, RemoveFilesSerializer
+
+
+def _parse_range(header: str, size: int) -> tuple[int, int] | None:
+    """First and last byte of a single `bytes=` range, or None to serve the whole file.
+
+    Malformed and multi-range headers are ignored; raises ValueError when the range can't be satisfied.
+    """
+    unit, _, ranges = header.partition("=")
+    first, separator, last = ranges.strip().partition("-")
+    if unit.strip() != "bytes" or not separator or not (first or last) \
+            or not all(part.isdigit() for part in (first, last) if part):
+        return None
+
+    if not first:
+        # Suffix range, the last N bytes
+        if int(last) == 0:
+            raise ValueError(header)
+        return max(size - int(last), 0), size - 1
+
+    start = int(first)
+    if last and int(last) < start:
+        return None
+    if start >= size:
+        raise ValueError(header)
+    return start, min(int(last), size - 1) if last else size - 1
 
 
 class FilesViewSetMixin:
@@ -22,6 +53,30 @@ class FilesViewSetMixin:
         except Exception as err:
             return Response(str(err), status=status.HTTP_400_BAD_REQUEST)
 
+    @action(detail=True, methods=['post'])
+    def add_files(self, request, *args, **kwargs):
+        """Add several files to the associated object, with a result per uuid."""
+        instance = self.get_object()
+        serializer = AddFilesSerializer(data=request.data)
+        if not serializer.is_valid():
+            return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
+        result = serializer.save(instance=instance)
+        if "error" in result:
+            return Response(result, status=status.HTTP_400_BAD_REQUEST)
+        return Response(result, status=status.HTTP_200_OK)
+
+    @action(detail=True, methods=['post'])
+    def remove_files(self, request, *args, **kwargs):
+        """Remove several files (by local id) from the associated object, with a result per id."""
+        instance = self.get_object()
+        serializer = RemoveFilesSerializer(data=request.data)
+        if not serializer.is_valid():
+            return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
+        result = serializer.save(instance=instance)
+        if "error" in result:
+            return Response(result, status=status.HTTP_400_BAD_REQUEST)
+        return Response(result, status=status.HTTP_200_OK)
+
     @action(detail=True, methods=['delete'], url_path='delete_file/(?P<file_id>[^/.]+)')
     def delete_file(self, request, file_id, *args, **kwargs):
         """Delete a file from the associated object."""
@@ -31,4 +86,53 @@ class FilesViewSetMixin:
             return Response(status=status.HTTP_204_NO_CONTENT)
 
         except Exception as err:
-            return Response({"error": str(err)}, status=status.HTTP_400_BAD_REQUEST)
\ No newline at end of file
+            return Response({"error": str(err)}, status=status.HTTP_400_BAD_REQUEST)
+
+    @action(detail=True, methods=['get'], url_path=r'download_file(?:/(?P<file_id>[^/.]+))?')
+    def download_file(self, request, file_id=None, *args, **kwargs):
+        """Stream a file of the associated object straight from the CDN."""
+        instance = self.get_object()
+        file_kwargs = {} if file_id is None else {"local_file_id": file_id}
+        try:
+            metadata = instance.get_file_metadata(**file_kwargs)
+        except Exception as err:
+            return Response({"error": str(err)}, status=status.HTTP_400_BAD_REQUEST)
+
+        # Ranges need the size, which the metadata leaves out for empty files
+        size = int(metadata.get("file_size") or 0)
+        byte_range = None
+        if size and request.headers.get("Range"):
+            try:
+                byte_range = _parse_range(request.headers["Range"], size)
+            except ValueError:
+                response = Response(status=status.HTTP_416_REQUESTED_RANGE_NOT_SATISFIABLE)
+                response["Content-Range"] = f"bytes */{size}"
+                return response
+
+        try:
+            if byte_range is None:
+                content = instance.iter_file_content(**file_kwargs)
+            else:
+                start, end = byte_range
+                content = instance.iter_file_content(offset=start, length=end - start + 1, **file_kwargs)
+            # The stream only starts on the first read, pull it here so errors still get a proper status
+            first_chunk = next(content, b"")
+        except grpc.RpcError as err:
+            error_status = status.HTTP_404_NOT_FOUND if err.code() == grpc.StatusCode.NOT_FOUND \
+                else status.HTTP_502_BAD_GATEWAY
+            return Response({"error": format_error(err)}, status=error_status)
+        except Exception as err:
+            return Response({"error": str(err)}, status=status.HTTP_400_BAD_REQUEST)
+
+        response = StreamingHttpResponse(chain([first_chunk], content),
+                                         content_type=metadata.get("file_type") or "application/octet-stream")
+        response["Content-Disposition"] = content_disposition_header(True, metadata.get("file_name") or "file")
+        response["Accept-Ranges"] = "bytes"
+        if byte_range is None:
+            if size:
+                response["Content-Length"] = str(size)
+        else:
+            response.status_code = status.HTTP_206_PARTIAL_CONTENT
+            response["Content-Range"] = f"bytes {start}-{end}/{size}"
+            response["Content-Length"] = str(end - start + 1)
+        return response
@@ -3,7 +3,7 @@ from setuptools import setup, find_packages
 setup(
     name="cdn_package",
     version="1.0.25",
-    packages=find_packages(),
+    packages=find_packages(exclude=["tests", "tests.*"]),
     install_requires=[
         "grpcio",
         "grpcio-tools",
@@ -0,0 +1,14 @@
+import django
+from django.conf import settings
+
+if not settings.configured:
+    settings.configure(
+        SERVICE_NAME="tests",
+        SUB_SERVICE_NAME="tests",
+        CDN_GRPC_ADDRESS="localhost",
+        INSTALLED_APPS=["django.contrib.contenttypes", "rest_framework", "cdn"],
+        DATABASES={"default": {"ENGINE": "django.db.backends.sqlite3", "NAME": ":memory:"}},
+        CACHES={"default": {"BACKEND": "django.core.cache.backends.locmem.LocMemCache"},
+                "cdn": {"BACKEND": "django.core.cache.backends.locmem.LocMemCache", "LOCATION": "cdn"}},
+    )
+    django.setup()
@@ -0,0 +1,28 @@
+import unittest
+
+from cdn.codecs import MetadataView, PickleCodec, ProtobufCodec
+from cdn.proto import cdn_pb2
+
+
+class CodecTests(unittest.TestCase):
+    def setUp(self):
+        self.message = cdn_pb2.FileMetadataResponse(file_name="a.png", file_size=3, uuid="u1")
+
+    def test_entries_are_readable_by_either_codec(self):
+        for writer in (PickleCodec(), ProtobufCodec()):
+            entry = writer.encode(writer.from_message(self.message))
+            for reader in (PickleCodec(), ProtobufCodec()):
+                with self.subTest(writer=type(writer).__name__, reader=type(reader).__name__):
+                    metadata = reader.decode(entry)
+                    self.assertEqual(metadata.get("file_name"), "a.png")
+                    self.assertEqual(dict(metadata), {"file_name": "a.png", "file_size": "3", "uuid": "u1"})
+
+    def test_metadata_view_matches_message_to_dict(self):
+        view = MetadataView(self.message.SerializeToString())
+        self.assertEqual(view["file_size"], "3")
+        self.assertNotIn("file_type", view)
+        self.assertEqual(dict(view), PickleCodec().from_message(self.message))
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,119 @@
+import hashlib
+import os
+import socket
+import tempfile
+import unittest
+from pathlib import Path
+from unittest import mock
+
+import grpc
+
+from cdn import client as client_module
+from cdn.client import CDNClient
+from cdn.servicer import LocalCDNServicer, create_server
+
+
+def _free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(("localhost", 0))
+        return sock.getsockname()[1]
+
+
+class IgnoresOffsetServicer(LocalCDNServicer):
+    """A server that always streams the whole file."""
+
+    def GetFileContent(self, request, context):
+        request.offset = 0
+        request.length = 0
+        return super().GetFileContent(request, context)
+
+
+class ServerTestCase(unittest.TestCase):
+    """Runs a LocalCDNServicer for the test case and points CDNClient at it."""
+    servicer_class = LocalCDNServicer
+
+    @classmethod
+    def setUpClass(cls):
+        port = _free_port()
+        cls.server, cls.servicer = create_server(f"localhost:{port}", cls.servicer_class(chunk_size=10))
+        channel_patch = mock.patch.object(client_module, "get_secure_channel",
+                                          lambda address, options=None: grpc.insecure_channel(f"localhost:{port}",
+                                                                                              options=options))
+        channel_patch.start()
+        cls.addClassCleanup(channel_patch.stop)
+        cls.addClassCleanup(cls.server.stop, None)
+        cls.addClassCleanup(CDNClient().close)
+
+    def setUp(self):
+        CDNClient().close()
+        self.client = CDNClient()
+        self.content = os.urandom(100)
+        self.uuid = self.servicer.add_file(self.content, "file.bin")
+        self.metadata = {"file_size": str(len(self.content)), "checksum": hashlib.sha256(self.content).hexdigest()}
+
+        tmp_dir = tempfile.TemporaryDirectory()
+        self.addCleanup(tmp_dir.cleanup)
+        self.partial_path = Path(tmp_dir.name) / "file.bin.partial"
+
+        for patcher in (mock.patch.object(CDNClient, "_download_retries", 2),
+                        mock.patch.object(client_module.time, "sleep")):
+            patcher.start()
+            self.addCleanup(patcher.stop)
+
+
+class DownloadResumableTests(ServerTestCase):
+    def test_download(self):
+        self.client._download_resumable(self.uuid, self.partial_path, self.metadata)
+        self.assertEqual(self.partial_path.read_bytes(), self.content)
+
+    def test_resumes_from_existing_partial(self):
+        self.partial_path.write_bytes(self.content[:35])
+        with mock.patch.object(self.client, "iter_file_content", wraps=self.client.iter_file_content) as iter_content:
+            self.client._download_resumable(self.uuid, self.partial_path, self.metadata)
+        iter_content.assert_called_once_with(self.uuid, offset=35)
+        self.assertEqual(self.partial_path.read_bytes(), self.content)
+
+    def test_resumes_broken_stream(self):
+        self.servicer.inject_failure(after_bytes=25, times=2)
+        self.client._download_resumable(self.uuid, self.partial_path, self.metadata)
+        self.assertEqual(self.partial_path.read_bytes(), self.content)
+
+    def test_retry_exhaustion_keeps_partial(self):
+        self.servicer.inject_failure(after_bytes=20, times=3)
+        with self.assertRaises(grpc.RpcError):
+            self.client._download_resumable(self.uuid, self.partial_path, self.metadata)
+        self.assertEqual(self.partial_path.read_bytes(), self.content[:60])
+
+        # The next attempt picks up where it stopped
+        self.client._download_resumable(self.uuid, self.partial_path, self.metadata)
+        self.assertEqual(self.partial_path.read_bytes(), self.content)
+
+    def test_failure_before_first_byte_leaves_no_partial(self):
+        self.servicer.inject_failure(after_bytes=0, code=grpc.StatusCode.PERMISSION_DENIED)
+        with self.assertRaises(grpc.RpcError):
+            self.client._download_resumable(self.uuid, self.partial_path, self.metadata)
+        self.assertFalse(self.partial_path.exists())
+
+    def test_checksum_mismatch_removes_partial(self):
+        metadata = {**self.metadata, "checksum": hashlib.sha256(b"other").hexdigest()}
+        with self.assertRaisesRegex(Exception, "Checksum mismatch"):
+            self.client._download_resumable(self.uuid, self.partial_path, metadata)
+        self.assertFalse(self.partial_path.exists())
+
+
+class ServerIgnoringOffsetTests(ServerTestCase):
+    servicer_class = IgnoresOffsetServicer
+
+    def test_oversized_result_removes_partial(self):
+        self.partial_path.write_bytes(self.content[:35])
+        with self.assertRaisesRegex(Exception, "Downloaded 135 of 100 bytes"):
+            self.client._download_resumable(self.uuid, self.partial_path, self.metadata)
+        self.assertFalse(self.partial_path.exists())
+
+    def test_range_read_rejects_whole_file(self):
+        with self.assertRaisesRegex(Exception, "more than the 5 bytes"):
+            self.client.read_range(self.uuid, 10, 5)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,118 @@
+import os
+import tempfile
+import time
+import unittest
+from pathlib import Path
+
+from cdn.storage import FileCache
+
+
+class FileCacheTests(unittest.TestCase):
+    def setUp(self):
+        self._dir = tempfile.TemporaryDirectory()
+        self.cache = FileCache(self._dir.name, max_bytes=30)
+
+    def tearDown(self):
+        self._dir.cleanup()
+
+    def _store(self, uuid: str, content: bytes, mtime: float = None) -> str:
+        tmp_path = self.cache.temp_path()
+        tmp_path.write_bytes(content)
+        path = self.cache.store(tmp_path, uuid, "1", "file.bin")
+        if mtime is not None:
+            os.utime(path, (mtime, mtime))
+        return path
+
+    def test_store_and_get(self):
+        path = self._store("a", b"x" * 10)
+        self.assertEqual(path, str(self.cache.path_for("a", "1", "file.bin")))
+        self.assertEqual(self.cache.get("a", "1", "file.bin"), path)
+        self.assertIsNone(self.cache.get("b", "1", "file.bin"))
+
+    def test_evicts_least_recently_used(self):
+        now = time.time()
+        self._store("a", b"x" * 10, mtime=now - 30)
+        self._store("b", b"x" * 10, mtime=now - 20)
+        self._store("c", b"x" * 10, mtime=now - 10)
+        path = self._store("d", b"x" * 10)
+
+        self.assertIsNone(self.cache.get("a", "1", "file.bin"))
+        self.assertIsNotNone(self.cache.get("b", "1", "file.bin"))
+        self.assertEqual(Path(path).read_bytes(), b"x" * 10)
+        self.assertEqual(self.cache.usage(), 30)
+
+    def test_new_entry_is_never_evicted(self):
+        self._store("a", b"x" * 10)
+        # Older than the entry already stored, e.g. a clock step or a copied file
+        path = self._store("b", b"x" * 25, mtime=time.time() - 60)
+
+        self.assertTrue(os.path.exists(path))
+        self.assertIsNone(self.cache.get("a", "1", "file.bin"))
+
+    def test_file_over_quota_is_not_stored(self):
+        self._store("a", b"x" * 10)
+        path = self._store("b", b"x" * 40)
+
+        self.assertEqual(Path(path).read_bytes(), b"x" * 40)
+        self.assertFalse(path.startswith(self._dir.name))
+        self.assertIsNone(self.cache.get("b", "1", "file.bin"))
+        self.assertIsNotNone(self.cache.get("a", "1", "file.bin"))
+        os.unlink(path)
+        os.rmdir(os.path.dirname(path))
+
+    def test_commit_partial(self):
+        partial_path = self.cache.partial_path_for("a", "1", "file.bin")
+        partial_path.parent.mkdir(parents=True)
+        partial_path.write_bytes(b"x" * 10)
+
+        path = self.cache.commit_partial("a", "1", "file.bin")
+        self.assertEqual(Path(path).read_bytes(), b"x" * 10)
+        self.assertFalse(partial_path.exists())
+
+    def test_partials_count_towards_usage(self):
+        partial_path = self.cache.partial_path_for("a", "1", "file.bin")
+        partial_path.parent.mkdir(parents=True)
+        partial_path.write_bytes(b"x" * 25)
+        self._store("b", b"x" * 10)
+
+        self.assertEqual(self.cache.usage(), 35)
+        # A download in progress is not evicted, the least recently used entry is
+        self.assertTrue(partial_path.exists())
+
+    def test_download_in_progress_over_quota_does_not_evict_entries(self):
+        self.cache.max_bytes = 100
+        now = time.time()
+        for uuid in ("a", "b", "c"):
+            self._store(uuid, b"x" * 20, mtime=now - 10)
+        partial_path = self.cache.partial_path_for("big", "1", "file.bin")
+        partial_path.parent.mkdir(parents=True)
+        partial_path.write_bytes(b"x" * 150)
+
+        self._store("d", b"x" * 5)
+        for uuid in ("a", "b", "c", "d"):
+            self.assertIsNotNone(self.cache.get(uuid, "1", "file.bin"))
+        self.assertTrue(partial_path.exists())
+        self.assertEqual(self.cache.usage(), 215)
+
+    def test_abandoned_partials_expire(self):
+        partial_path = self.cache.partial_path_for("a", "1", "file.bin")
+        partial_path.parent.mkdir(parents=True)
+        partial_path.write_bytes(b"x" * 5)
+        expired = time.time() - self.cache.partial_max_age - 1
+        os.utime(partial_path, (expired, expired))
+        self._store("b", b"x" * 10)
+
+        self.assertFalse(partial_path.exists())
+        self.assertEqual(self.cache.usage(), 10)
+
+    def test_delete(self):
+        self._store("a", b"x" * 10)
+        with self.cache.download_lock("a", "1", "file.bin"):
+            pass
+        self.cache.delete("a")
+        self.assertIsNone(self.cache.get("a", "1", "file.bin"))
+        self.assertEqual(list(self.cache.root.glob("a/*/*")), [])
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,99 @@
+import os
+import unittest
+from unittest import mock
+
+from django.db import transaction
+
+from cdn import tasks
+from cdn.tasks import ASSIGN, UNASSIGN, defer_operations
+
+
+def operation(action: str, uuid: str, object_id: int = 1) -> dict:
+    return {"action": action, "uuid": uuid, "content_type_id": 1, "object_id": object_id, "local_id": 1}
+
+
+class DeferOperationsTests(unittest.TestCase):
+    def setUp(self):
+        self.submitted = []
+        executor = mock.Mock(submit=self.submitted.append)
+        patcher = mock.patch.object(tasks, "get_executor", return_value=executor)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def test_outside_transaction_submits_right_away(self):
+        defer_operations([operation(ASSIGN, "a")])
+        self.assertEqual(self.submitted, [[operation(ASSIGN, "a")]])
+
+    def test_one_batch_per_commit(self):
+        with transaction.atomic():
+            defer_operations([operation(ASSIGN, "a")])
+            defer_operations([operation(ASSIGN, "b")])
+            defer_operations([operation(UNASSIGN, "a")])
+            self.assertEqual(self.submitted, [])
+        self.assertEqual(self.submitted, [[operation(ASSIGN, "b")]])
+
+    def test_outer_rollback_drops_everything(self):
+        with self.assertRaises(RuntimeError):
+            with transaction.atomic():
+                defer_operations([operation(ASSIGN, "a")])
+                with transaction.atomic():
+                    defer_operations([operation(ASSIGN, "b")])
+                raise RuntimeError
+        self.assertEqual(self.submitted, [])
+
+        # The next transaction starts from an empty batch
+        with transaction.atomic():
+            defer_operations([operation(ASSIGN, "c")])
+        self.assertEqual(self.submitted, [[operation(ASSIGN, "c")]])
+
+    def test_savepoint_rollback_drops_its_operations(self):
+        with transaction.atomic():
+            defer_operations([operation(ASSIGN, "a")])
+            with self.assertRaises(RuntimeError):
+                with transaction.atomic():
+                    defer_operations([operation(ASSIGN, "b")])
+                    with transaction.atomic():
+                        defer_operations([operation(ASSIGN, "c")])
+                    raise RuntimeError
+            defer_operations([operation(ASSIGN, "d")])
+        self.assertEqual(self.submitted, [[operation(ASSIGN, "a"), operation(ASSIGN, "d")]])
+
+    def test_savepoint_rollback_before_first_outer_operation(self):
+        with transaction.atomic():
+            with self.assertRaises(RuntimeError):
+                with transaction.atomic():
+                    defer_operations([operation(ASSIGN, "a")])
+                    raise RuntimeError
+            defer_operations([operation(ASSIGN, "b")])
+        self.assertEqual(self.submitted, [[operation(ASSIGN, "b")]])
+
+    def test_released_savepoint_is_kept_and_coalesced(self):
+        with transaction.atomic():
+            defer_operations([operation(ASSIGN, "a")])
+            with transaction.atomic():
+                defer_operations([operation(UNASSIGN, "a"), operation(ASSIGN, "b")])
+            with transaction.atomic():
+                defer_operations([operation(ASSIGN, "c")])
+        self.assertEqual(self.submitted, [[operation(ASSIGN, "b"), operation(ASSIGN, "c")]])
+
+
+
+@unittest.skipUnless(hasattr(os, "fork"), "needs os.fork")
+class ExecutorForkTests(unittest.TestCase):
+    def test_child_gets_its_own_executor(self):
+        parent_executor = tasks.get_executor()
+        pid = os.fork()
+        if pid == 0:
+            ok = False
+            try:
+                executor = tasks.get_executor()
+                ok = executor is not parent_executor and executor._executor.submit(lambda: True).result(timeout=5)
+            finally:
+                os._exit(0 if ok else 1)
+        _, status = os.waitpid(pid, 0)
+        self.assertEqual(os.waitstatus_to_exitcode(status), 0)
+        self.assertIs(tasks.get_executor(), parent_executor)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,36 @@
+import unittest
+
+from cdn.views import _parse_range
+
+
+class ParseRangeTests(unittest.TestCase):
+    def test_ranges(self):
+        cases = [
+            ("bytes=0-99", (0, 99)),
+            ("bytes=10-19", (10, 19)),
+            ("bytes=10-", (10, 99)),  # open-ended
+            ("bytes=90-200", (90, 99)),  # clamped to the last byte
+            ("bytes=99-99", (99, 99)),
+            ("bytes=-10", (90, 99)),  # suffix
+            ("bytes=-500", (0, 99)),  # suffix longer than the file
+            (" bytes = 5-6 ", (5, 6)),
+        ]
+        for header, expected in cases:
+            with self.subTest(header=header):
+                self.assertEqual(_parse_range(header, 100), expected)
+
+    def test_ignored_headers_serve_the_whole_file(self):
+        for header in ("bytes=0-1,5-6", "bytes=5", "bytes=-", "bytes=a-b", "bytes=-5x", "items=0-5",
+                       "bytes=20-10", "0-5", ""):
+            with self.subTest(header=header):
+                self.assertIsNone(_parse_range(header, 100))
+
+    def test_unsatisfiable_ranges(self):
+        for header in ("bytes=100-", "bytes=100-200", "bytes=-0"):
+            with self.subTest(header=header):
+                with self.assertRaises(ValueError):
+                    _parse_range(header, 100)
+
+
+if __name__ == "__main__":
+    unittest.main()